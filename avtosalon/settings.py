@@ -131,6 +131,17 @@ SELLER_INFO = {
     'registration_address': 'г. Москва, ул. Продавцовая, д. 1, кв. 1',
 }
 SHOWROOM_NAME = 'РKA-AВТО'
+# Колоночный индекс каталога в памяти (catalog/inventory_index.py), требует numpy
+CATALOG_INVENTORY_INDEX = False
+# Сколько секунд хранить страницы каталога для анонимных посетителей (сброс - при изменении инвентаря)
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 15
+# Как часто обновлять пул случайных автомобилей для главной, если инвентарь не меняется
+CATALOG_FEATURED_POOL_TIMEOUT = 60 * 10
+# Сколько секунд воркер держит справочник марок; правка Brand сбрасывает кэш только в своем процессе
+CATALOG_BRAND_COUNTRIES_TIMEOUT = 60
+# Файл фото, загруженный или переиспользованный позже этого (секунды), не удаляется вместе с последней
+# ссылкой: его может ждать еще не закоммиченная загрузка. Такие файлы потом убирает gc_photo_files
+CATALOG_PHOTO_RELEASE_GRACE = 5 * 60
 
 JAZZMIN_SETTINGS = {
     "site_title": "Панель управления Автосалоном",
@@ -1,46 +1,65 @@
 from django.contrib import admin
-from .models import Car, Feature,CarPhoto, Characteristic, InspectionRequest
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
+from .models import Brand, Car, Feature,CarPhoto, Characteristic, InspectionRequest, PurchaseAgreementRequest, Task
+from .agreement_archive import agreements_zip
+from .export import CONTENT_TYPES, EXPORT_FORMATS, export_lines, parse_since
+from .photos import MAX_PHOTOS_PER_CAR, ensure_main_photo
+from .search import search_cars
 
 class CarPhotoInline(admin.TabularInline):
     model = CarPhoto
     extra = 3 
     fields = ('image', 'is_main')
-    max_num = 20 
+    max_num = MAX_PHOTOS_PER_CAR
 @admin.register(Car)
 class CarAdmin(admin.ModelAdmin):
     inlines = [CarPhotoInline]
     list_display = ('brand', 'model', 'year', 'price', 'country', 'is_sold', 'is_published')
     list_filter = ('brand', 'year', 'country', 'is_sold', 'is_published')
-    search_fields = ('brand', 'model', 'vin')
+    search_fields = ('brand', 'model', 'generation')
     list_editable = ('price', 'is_sold', 'is_published')
     filter_horizontal = ('features', 'characteristics')
-    def save_model(self, request, obj, form, change):
-        japanese_brands = ['Toyota', 'Nissan', 'Honda', 'Mazda', 'Subaru', 'Mitsubishi', 'Suzuki']
-        german_brands = ['BMW', 'Mercedes', 'Audi', 'Volkswagen', 'Opel', 'Porsche']
-        korean_brands = ['Hyundai', 'Kia', 'Daewoo']
-        american_brands = ['Ford', 'Chevrolet', 'Cadillac', 'Jeep', 'Chrysler']
-        french_brands = ['Renault', 'Peugeot', 'Citroen']
-        italian_brands = ['Fiat', 'Alfa Romeo', 'Ferrari', 'Lamborghini']
-        russian_brands = ['Lada', 'GAZ', 'UAZ']
-        
-        if obj.brand in japanese_brands:
-            obj.country = 'japan'
-        elif obj.brand in german_brands:
-            obj.country = 'germany'
-        elif obj.brand in korean_brands:
-            obj.country = 'korea'
-        elif obj.brand in american_brands:
-            obj.country = 'usa'
-        elif obj.brand in french_brands:
-            obj.country = 'france'
-        elif obj.brand in italian_brands:
-            obj.country = 'italy'
-        elif obj.brand in russian_brands:
-            obj.country = 'russia'
-        else:
-            obj.country = 'other'
-        
-        super().save_model(request, obj, form, change)
+    # Страна выводится из марки по справочнику Brand
+    readonly_fields = ('country',)
+
+    def get_urls(self):
+        urls = [
+            path('export/', self.admin_site.admin_view(self.export_view), name='catalog_car_export'),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        """Выгрузка инвентаря: ?format=csv|jsonl|yml&since=2025-01-01"""
+        export_format = request.GET.get('format', 'yml')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest(f'Неизвестный формат выгрузки: {export_format}')
+        since = None
+        if request.GET.get('since'):
+            since = parse_since(request.GET['since'])
+            if since is None:
+                return HttpResponseBadRequest('Не удалось разобрать дату since')
+
+        lines = export_lines(export_format, request.build_absolute_uri('/'), since=since)
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="inventory.{export_format}"'
+        return response
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ensure_main_photo(form.instance.pk)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_cars(queryset, search_term), False
+
+@admin.register(Brand)
+class BrandAdmin(admin.ModelAdmin):
+    list_display = ('name', 'country')
+    list_filter = ('country',)
+    list_editable = ('country',)
+    search_fields = ('name',)
 
 @admin.register(Feature)
 class FeatureAdmin(admin.ModelAdmin):
@@ -74,4 +93,25 @@ class InspectionRequestAdmin(admin.ModelAdmin):
     )
     
     def has_add_permission(self, request):
-        return False
\ No newline at end of file
+        return False
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'payload', 'attempts', 'locked_until', 'locked_by', 'last_error', 'created_at', 'finished_at')
+
+@admin.register(PurchaseAgreementRequest)
+class PurchaseAgreementRequestAdmin(admin.ModelAdmin):
+    list_display = ('buyer_full_name', 'car_brand', 'car_model', 'car_price', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('buyer_full_name', 'car_brand', 'car_model', 'car_vin')
+    date_hierarchy = 'created_at'
+    actions = ['download_agreements']
+
+    @admin.action(description='Скачать PDF выбранных договоров (ZIP)')
+    def download_agreements(self, request, queryset):
+        agreements = queryset.select_related('car').order_by('created_at', 'id').iterator(chunk_size=200)
+        response = StreamingHttpResponse(agreements_zip(agreements), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="agreements.zip"'
+        return response
@@ -0,0 +1,99 @@
+"""
+Пакетная выгрузка договоров в ZIP.
+
+Договоры рендерятся в пуле процессов (рендер упирается в процессор, потоки из-за GIL
+не помогают), в работе одновременно не больше WINDOW_PER_WORKER договоров на процесс.
+Готовые PDF сразу дописываются в архив и отдаются кусками: весь ZIP в памяти не
+собирается. Рендер тот же, что у одиночного договора, - agreement_pdf.render_agreement_pdf,
+и отрендеренные файлы сохраняются в agreement_store так же, как при скачивании.
+"""
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+from .agreement_pdf import agreement_filename, render_agreement_pdf
+from .agreement_store import is_current, store_pdf
+
+WINDOW_PER_WORKER = 2
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def archive_name(agreement):
+    # id в имени: у одинаковых машин одинаковые имена файлов
+    return f'{agreement.pk}-{agreement_filename(agreement)}'
+
+
+def stored_or_rendered(agreement, future):
+    if future is None:
+        with agreement.pdf.open('rb') as f:
+            return f.read()
+    content = future.result()
+    # Сохраняем, чтобы следующая выгрузка или скачивание обошлись без рендера
+    store_pdf(agreement, content)
+    return content
+
+
+def rendered_agreements(agreements, workers=None):
+    """(имя в архиве, PDF) в порядке agreements; актуальные сохраненные PDF берутся из хранилища"""
+    workers = workers or default_workers()
+    window = deque()
+    # initializer нужен для платформ, где процессы пула запускаются через spawn
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+    try:
+        for agreement in agreements:
+            future = None if is_current(agreement) else pool.submit(render_agreement_pdf, agreement)
+            window.append((agreement, future))
+            if len(window) >= workers * WINDOW_PER_WORKER:
+                agreement, future = window.popleft()
+                yield archive_name(agreement), stored_or_rendered(agreement, future)
+        while window:
+            agreement, future = window.popleft()
+            yield archive_name(agreement), stored_or_rendered(agreement, future)
+    finally:
+        # Клиент мог оборвать скачивание - не дорендериваем то, что уже никому не нужно
+        pool.shutdown(cancel_futures=True)
+
+
+class ZipBuffer:
+    """Приемник для ZipFile без seek: zipfile пишет записи с дескрипторами данных"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(files):
+    """Куски ZIP-архива из (имя, содержимое); после каждого файла буфер отдается и очищается"""
+    buffer = ZipBuffer()
+    # PDF уже сжаты внутри, повторное сжатие только тратит процессор
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield buffer.take()
+    yield buffer.take()
+
+
+def agreements_zip(agreements, workers=None):
+    return zip_chunks(rendered_agreements(agreements, workers))
@@ -0,0 +1,304 @@
+"""
+Рендер PDF договора купли-продажи.
+
+Бланк dkp.pdf и шрифты Times (по ~1 МБ каждый) разбираются один раз на процесс и
+переиспользуются всеми потоками воркера; при замене файла (другой mtime) загружаются
+заново. На каждый договор рисуется только слой с данными, который накладывается на
+копию страницы бланка как отдельный Form XObject: содержимое бланка при этом не
+разбирается (PageObject.merge_page трижды разбирает и пересобирает его на каждый PDF).
+"""
+import os
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.utils import timezone
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+
+def static_path(*parts):
+    return os.path.join(settings.BASE_DIR, 'catalog', 'static', *parts)
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class FileCache:
+    """Значение, построенное из файлов; строится заново, когда у любого файла меняется mtime"""
+
+    def __init__(self, loader, paths):
+        self.loader = loader
+        # Функция, а не список: пути зависят от settings.BASE_DIR
+        self.paths = paths
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self):
+        paths = self.paths()
+        key = (paths, tuple(mtime(path) for path in paths))
+        entry = self._entry
+        if entry is None or entry[0] != key:
+            with self._lock:
+                entry = self._entry
+                if entry is None or entry[0] != key:
+                    entry = self._entry = (key, self.loader(*paths))
+        return entry[1]
+
+    def reset(self):
+        with self._lock:
+            self._entry = None
+
+
+FONTS = {'Times-Roman': 'times.ttf', 'Times-Bold': 'timesbd.ttf'}
+
+
+def load_fonts(*paths):
+    """Регистрирует TTF-шрифты с кириллицей; имя основного шрифта или Helvetica, если файлов нет"""
+    registered = []
+    for name, path in zip(FONTS, paths):
+        if os.path.exists(path):
+            pdfmetrics.registerFont(TTFont(name, path))
+            registered.append(name)
+    return 'Times-Roman' if 'Times-Roman' in registered else 'Helvetica'
+
+
+class TemplatePage:
+    """Разобранный бланк в памяти; страница копируется в новый документ под блокировкой"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.reader = PdfReader(BytesIO(f.read()))
+        self.page = self.reader.pages[0]
+        self._lock = threading.Lock()
+        # Пробная копия разрешает все объекты страницы, дальше читаются только готовые
+        PdfWriter().add_page(self.page)
+
+    def add_to(self, writer):
+        with self._lock:
+            return writer.add_page(self.page)
+
+
+def load_template(path):
+    return TemplatePage(path) if os.path.exists(path) else None
+
+
+fonts = FileCache(load_fonts, lambda: tuple(static_path('fonts', filename) for filename in FONTS.values()))
+template = FileCache(load_template, lambda: (static_path('dkp.pdf'),))
+
+
+def reset_caches():
+    fonts.reset()
+    template.reset()
+
+
+def agreement_date(agreement):
+    """Дата договора - дата заявки, чтобы повторный рендер давал тот же документ"""
+    if agreement.created_at is None:
+        return timezone.localdate()
+    return timezone.localtime(agreement.created_at).date()
+
+
+def agreement_filename(agreement):
+    return f'dogovor-kupli-prodazhi-{agreement.car_brand}-{agreement.car_model}.pdf'
+
+
+def draw_overlay(can, agreement, font_name):
+    """Данные договора по координатам полей бланка dkp.pdf"""
+    can.setFont(font_name, 10)
+
+    can.drawString(40, 743, agreement.seller_full_name)
+    can.drawString(40, 722, f"Паспорт: {agreement.seller_passport_series} {agreement.seller_passport_number}")
+    can.drawString(40, 700, f"Выдан: {agreement.seller_passport_issued}")
+    can.drawString(40, 679, f"Адрес: {agreement.seller_registration_address}")
+
+    can.drawString(40, 640, agreement.buyer_full_name)
+    can.drawString(40, 618, f"Паспорт: {agreement.buyer_passport_series} {agreement.buyer_passport_number}")
+    can.drawString(40, 597, f"Выдан: {agreement.buyer_passport_issued}")
+    can.drawString(40, 576, f"Адрес: {agreement.buyer_registration_address}")
+
+    can.drawString(40, 475, f"{agreement.car_brand} {agreement.car_model}")
+    can.drawString(50, 454, agreement.car_vin or "не указан")
+    can.drawString(410, 454, str(agreement.car_year))
+
+    car_color = agreement.car.color if hasattr(agreement.car, 'color') and agreement.car.color else 'не указан'
+    can.drawString(250, 410, car_color)
+
+    can.drawString(250, 454, agreement.car_license_plate or "не указан")
+
+    can.drawString(55, 303, f"{agreement.car_price:,} руб.".replace(',', ' '))
+    can.drawString(200, 303, num2words(agreement.car_price) + " рублей")
+
+    can.drawString(240, 809, "Барнаул")
+    can.drawString(285, 809, agreement_date(agreement).strftime('%d.%m.%Y'))
+
+
+OVERLAY_NAME = NameObject('/AgreementData')
+
+
+def add_stream(writer, data):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def stamp_overlay(writer, page, overlay):
+    """Рисует страницу overlay поверх page; потоки бланка только переиспользуются, без разбора"""
+    form = overlay['/Contents'].get_object().clone(writer)
+    form.update({
+        NameObject('/Type'): NameObject('/XObject'),
+        NameObject('/Subtype'): NameObject('/Form'),
+        NameObject('/BBox'): ArrayObject(overlay.mediabox),
+        NameObject('/Resources'): overlay['/Resources'].get_object().clone(writer),
+    })
+    resources = page['/Resources'].get_object()
+    if '/XObject' not in resources:
+        resources[NameObject('/XObject')] = DictionaryObject()
+    resources['/XObject'].get_object()[OVERLAY_NAME] = form.indirect_reference or writer._add_object(form)
+
+    contents = page['/Contents']
+    parts = list(contents.get_object()) if isinstance(contents.get_object(), ArrayObject) else [contents]
+    # q ... Q изолирует состояние графики бланка, чтобы оно не сдвинуло слой с данными
+    page[NameObject('/Contents')] = ArrayObject([
+        add_stream(writer, b'q\n'), *parts, add_stream(writer, b'\nQ q ' + OVERLAY_NAME.encode() + b' Do Q\n'),
+    ])
+
+
+def render_agreement_pdf(agreement):
+    """PDF договора на бланке dkp.pdf; без бланка - упрощенный вариант"""
+    template_page = template.get()
+    if template_page is None:
+        return render_simple_agreement_pdf(agreement)
+
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    draw_overlay(can, agreement, fonts.get())
+    can.save()
+    packet.seek(0)
+
+    writer = PdfWriter()
+    page = template_page.add_to(writer)
+    stamp_overlay(writer, page, PdfReader(packet).pages[0])
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def render_simple_agreement_pdf(agreement):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    fonts.get()
+
+    y_position = height - 50
+    line_height = 14
+
+    p.setFont('Times-Bold', 16)
+    p.drawCentredString(width/2, y_position, "ДОГОВОР КУПЛИ-ПРОДАЖИ АВТОМОБИЛЯ")
+    y_position -= 40
+
+    p.setFont('Times-Roman', 12)
+    p.drawString(100, y_position, "Город Барнаул")
+    p.drawString(250, y_position, f"{agreement_date(agreement).strftime('%d.%m.%Y')} г.")
+    y_position -= 40
+
+    p.drawString(50, y_position, f"Продавец: {agreement.seller_full_name}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Паспорт: {agreement.seller_passport_series} № {agreement.seller_passport_number}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Выдан: {agreement.seller_passport_issued}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Адрес: {agreement.seller_registration_address}")
+    y_position -= line_height * 2
+
+    p.drawString(50, y_position, f"Покупатель: {agreement.buyer_full_name}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Паспорт: {agreement.buyer_passport_series} № {agreement.buyer_passport_number}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Выдан: {agreement.buyer_passport_issued}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Адрес: {agreement.buyer_registration_address}")
+    y_position -= line_height * 2
+
+    p.drawString(50, y_position, f"Автомобиль: {agreement.car_brand} {agreement.car_model}, {agreement.car_year} г.в.")
+    y_position -= line_height
+    p.drawString(50, y_position, f"VIN: {agreement.car_vin or 'не указан'}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Госномер: {agreement.car_license_plate or 'не указан'}")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Стоимость: {agreement.car_price:,} руб. ({num2words(agreement.car_price)} рублей)".replace(',', ' '))
+    y_position -= line_height * 2
+
+    p.drawString(50, y_position, "Продавец: _________________________")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Ф.И.О.: {agreement.seller_full_name}")
+    y_position -= line_height * 2
+
+    p.drawString(50, y_position, "Покупатель: _________________________")
+    y_position -= line_height
+    p.drawString(50, y_position, f"Ф.И.О.: {agreement.buyer_full_name}")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def num2words(num, lang='ru'):
+    """Функция для преобразования числа в слова (упрощенная версия)"""
+    if num == 0:
+        return 'ноль'
+
+    units = ['', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять']
+    teens = ['десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать',
+             'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать']
+    tens = ['', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто']
+    hundreds = ['', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот']
+
+    def convert_triplet(n):
+        """Конвертирует трехзначное число"""
+        result = []
+
+        if n >= 100:
+            result.append(hundreds[n // 100])
+            n %= 100
+
+        if n >= 20:
+            result.append(tens[n // 10])
+            if n % 10 > 0:
+                result.append(units[n % 10])
+        elif n >= 10:
+            result.append(teens[n - 10])
+        elif n > 0:
+            result.append(units[n])
+
+        return ' '.join(result)
+
+    result_parts = []
+    n = num
+
+    if n >= 1000000:
+        millions_part = n // 1000000
+        result_parts.append(convert_triplet(millions_part))
+        result_parts.append('миллионов')
+        n %= 1000000
+
+    if n >= 1000:
+        thousands_part = n // 1000
+        result_parts.append(convert_triplet(thousands_part))
+        result_parts.append('тысяч')
+        n %= 1000
+
+    if n > 0:
+        result_parts.append(convert_triplet(n))
+
+    return ' '.join(result_parts)
@@ -0,0 +1,103 @@
+"""
+Хранение готовых PDF договоров.
+
+Файл называется по отпечатку договора - хешу всех его полей, даты, цвета автомобиля
+и версии бланка (содержимое dkp.pdf и шрифтов плюс RENDER_VERSION). Пока отпечаток не
+изменился, договор отдается из хранилища без рендера; повторная заявка с теми же
+данными ссылается на тот же файл. Новый рендер нужен, только когда поменялись данные
+или бланк.
+"""
+import hashlib
+import json
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import agreement_pdf
+from .agreement_pdf import FileCache, agreement_date, render_agreement_pdf
+from .models import PurchaseAgreementRequest
+from .storage import content_name
+
+# Поднять при изменении draw_overlay или упрощенного договора: бланк тот же, а PDF другой
+RENDER_VERSION = 1
+NOT_FINGERPRINTED = ('id', 'car', 'created_at', 'pdf', 'pdf_hash')
+
+
+def files_digest(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode())
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            digest.update(b'-')
+    return digest.hexdigest()
+
+
+template_version = FileCache(
+    files_digest, lambda: agreement_pdf.template.paths() + agreement_pdf.fonts.paths(),
+)
+
+
+def agreement_fingerprint(agreement):
+    data = {
+        field.attname: getattr(agreement, field.attname)
+        for field in PurchaseAgreementRequest._meta.concrete_fields
+        if field.name not in NOT_FINGERPRINTED
+    }
+    data['car_color'] = agreement.car.color or ''
+    data['date'] = agreement_date(agreement).isoformat()
+    data['template'] = template_version.get()
+    data['render_version'] = RENDER_VERSION
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def pdf_name(fingerprint):
+    return content_name('agreements', fingerprint, '.pdf')
+
+
+def is_current(agreement):
+    """PDF договора есть и соответствует его данным и текущему бланку"""
+    return bool(agreement.pdf) and agreement.pdf_hash == agreement_fingerprint(agreement)
+
+
+def link_pdf(agreement, fingerprint, name):
+    old_name = agreement.pdf.name
+    agreement.pdf.name = name
+    agreement.pdf_hash = fingerprint
+    agreement.save(update_fields=['pdf', 'pdf_hash'])
+    if old_name and old_name != name:
+        transaction.on_commit(lambda: release_agreement_file(old_name))
+
+
+def store_pdf(agreement, content, fingerprint=None):
+    """Сохраняет уже отрендеренный PDF под отпечатком договора и привязывает его"""
+    fingerprint = fingerprint or agreement_fingerprint(agreement)
+    name = pdf_name(fingerprint)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    link_pdf(agreement, fingerprint, name)
+
+
+def ensure_pdf(agreement):
+    """Привязывает к договору актуальный PDF; True, если пришлось рендерить"""
+    fingerprint = agreement_fingerprint(agreement)
+    if agreement.pdf and agreement.pdf_hash == fingerprint:
+        return False
+    name = pdf_name(fingerprint)
+    if default_storage.exists(name):
+        link_pdf(agreement, fingerprint, name)
+        return False
+    store_pdf(agreement, render_agreement_pdf(agreement), fingerprint)
+    return True
+
+
+def release_agreement_file(name):
+    """Удаляет PDF, если на него больше не ссылается ни один договор"""
+    if not name or PurchaseAgreementRequest.objects.filter(pdf=name).exists():
+        return False
+    default_storage.delete(name)
+    return True
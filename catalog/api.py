@@ -0,0 +1,50 @@
+"""Вспомогательные функции JSON API каталога (/api/cars/)"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Поля, которые можно запросить через fields=; внутренние флаги и маски наружу не отдаются
+API_FIELDS = (
+    'id', 'brand', 'model', 'generation', 'price', 'year', 'mileage', 'color', 'country',
+    'body_type', 'engine_type', 'engine_volume', 'engine_power', 'transmission', 'drive',
+    'condition', 'owners', 'documents', 'steering', 'description', 'created_at', 'updated_at',
+)
+DEFAULT_API_FIELDS = ('id', 'brand', 'model', 'year', 'price', 'mileage')
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 2000
+
+
+def parse_fields(value):
+    """Список полей из fields=; возвращает (поля, неизвестные поля)"""
+    if not value:
+        return list(DEFAULT_API_FIELDS), []
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    unknown = [name for name in fields if name not in API_FIELDS]
+    return fields, unknown
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return API_PAGE_SIZE
+    return max(1, min(limit, API_MAX_PAGE_SIZE))
+
+
+def project(row, fields):
+    return {name: row[name] for name in fields}
+
+
+def dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def jsonl_lines(queryset, fields):
+    """JSON Lines по queryset.values(); iterator() держит в памяти только один чанк"""
+    for row in queryset.values(*fields).iterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield dumps(row) + '\n'
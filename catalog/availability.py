@@ -0,0 +1,77 @@
+"""
+Свободные слоты записи на осмотр сразу на диапазон дат - для календаря на месяц.
+
+Занятость всего диапазона читается одним запросом с GROUP BY по дате и слоту. Каждый
+рабочий день кодируется 8-битной маской свободных слотов: бит i соответствует
+InspectionRequest.TIME_SLOTS[i]. Результат кэшируется до следующего изменения заявок
+(версия inspections_version меняется в сигналах).
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .cache import inspections_version
+from .models import InspectionRequest
+
+MAX_DAYS = 60
+DEFAULT_DAYS = 31
+ACTIVE_STATUSES = ('pending', 'confirmed')
+SLOTS = [value for value, _label in InspectionRequest.TIME_SLOTS]
+SLOT_BITS = {slot: 1 << index for index, slot in enumerate(SLOTS)}
+ALL_FREE = (1 << len(SLOTS)) - 1
+CACHE_TIMEOUT = 60 * 60
+
+
+def is_working_day(date):
+    """Автосалон не работает по выходным; то же правило проверяет форма записи"""
+    return date.weekday() < 5
+
+
+def parse_range(params):
+    """
+    Начало (не раньше сегодня) и длина диапазона из GET; (None, None), если дата не разобрана.
+    Неразобранная длина, как limit в API каталога, заменяется на DEFAULT_DAYS
+    """
+    today = timezone.localdate()
+    try:
+        start = datetime.date.fromisoformat(params['start']) if params.get('start') else today
+    except ValueError:
+        return None, None
+    try:
+        days = int(params.get('days', DEFAULT_DAYS))
+    except ValueError:
+        days = DEFAULT_DAYS
+    return max(start, today), max(1, min(days, MAX_DAYS))
+
+
+def busy_masks(start, end):
+    """Маски занятых слотов по датам от start до end включительно - один запрос"""
+    rows = InspectionRequest.objects.filter(
+        inspection_date__range=(start, end), status__in=ACTIVE_STATUSES,
+    ).values_list('inspection_date', 'inspection_time').annotate(Count('id')).order_by()
+    masks = {}
+    for date, slot, _count in rows:
+        masks[date] = masks.get(date, 0) | SLOT_BITS.get(slot, 0)
+    return masks
+
+
+def free_slot_masks(start, days):
+    """{дата ISO: маска свободных слотов} для рабочих дней диапазона; выходные пропущены"""
+    key = f'catalog:availability:{inspections_version()}:{start.isoformat()}:{days}'
+    result = cache.get(key)
+    if result is None:
+        end = start + datetime.timedelta(days=days - 1)
+        busy = busy_masks(start, end)
+        result = {}
+        for offset in range(days):
+            date = start + datetime.timedelta(days=offset)
+            if is_working_day(date):
+                result[date.isoformat()] = ALL_FREE & ~busy.get(date, 0)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def free_slots(mask):
+    return [slot for slot in SLOTS if mask & SLOT_BITS[slot]]
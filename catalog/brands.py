@@ -0,0 +1,54 @@
+"""
+Страна производителя по марке автомобиля.
+
+Справочник хранится в таблице Brand и редактируется в админке; в коде используется
+словарь марка -> страна из кэша, который сбрасывается сигналами при изменении Brand.
+Сигнал сбрасывает кэш только в своем процессе, поэтому у словаря конечный срок жизни:
+остальные воркеры подхватят правку не позже чем через CATALOG_BRAND_COUNTRIES_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+BRAND_COUNTRIES_KEY = 'catalog:brand-countries'
+
+
+def brand_countries():
+    countries = cache.get(BRAND_COUNTRIES_KEY)
+    if countries is None:
+        from .models import Brand
+
+        countries = dict(Brand.objects.values_list('name', 'country'))
+        cache.set(BRAND_COUNTRIES_KEY, countries, settings.CATALOG_BRAND_COUNTRIES_TIMEOUT)
+    return countries
+
+
+def country_for_brand(brand):
+    return brand_countries().get(brand, 'other')
+
+
+def reset_brand_countries():
+    cache.delete(BRAND_COUNTRIES_KEY)
+
+
+def refresh_car_countries(brands=None):
+    """
+    Перевыводит Car.country из справочника: один UPDATE на страну (или только для марок brands).
+    Возвращает {страна: сколько автомобилей изменилось}. update() не вызывает сигналов,
+    поэтому версию автомобилей при изменениях поднимает сам.
+    """
+    from .cache import bump_cars_version
+    from .models import Brand, Car
+
+    cars = Car.objects.all() if brands is None else Car.objects.filter(brand__in=brands)
+    changed = {}
+    for country, _label in Car.COUNTRY_CHOICES:
+        if country == 'other':
+            matching = cars.exclude(brand__in=Brand.objects.values('name'))
+        else:
+            matching = cars.filter(brand__in=Brand.objects.filter(country=country).values('name'))
+        count = matching.exclude(country=country).update(country=country)
+        if count:
+            changed[country] = count
+    if changed:
+        bump_cars_version()
+    return changed
@@ -0,0 +1,104 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+INVENTORY_VERSION_KEY = 'catalog:inventory-version'
+INSPECTIONS_VERSION_KEY = 'catalog:inspections-version'
+CARS_VERSION_KEY = 'catalog:cars-version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def inventory_version():
+    """Текущая версия инвентаря; меняется при любом изменении автомобилей"""
+    return get_version(INVENTORY_VERSION_KEY)
+
+
+def bump_inventory_version(**kwargs):
+    """Инвалидирует все кэши, завязанные на версию инвентаря. Подходит как обработчик сигнала"""
+    bump_version(INVENTORY_VERSION_KEY)
+
+
+def cars_version():
+    """Версия полей и опций самих автомобилей - по ней сверяется индекс инвентаря в памяти;
+    фото и характеристики ее не меняют"""
+    return get_version(CARS_VERSION_KEY)
+
+
+def bump_cars_version(**kwargs):
+    """Изменение автомобилей: меняет и версию инвентаря"""
+    bump_version(INVENTORY_VERSION_KEY)
+    bump_version(CARS_VERSION_KEY)
+
+
+def inspections_version():
+    """Версия записей на осмотр; меняется при любом сохранении или удалении заявки"""
+    return get_version(INSPECTIONS_VERSION_KEY)
+
+
+def bump_inspections_version(**kwargs):
+    bump_version(INSPECTIONS_VERSION_KEY)
+
+
+def normalize_params(params, ignore=()):
+    """Стабильная строка из GET-параметров: ключи отсортированы, пустые значения отброшены"""
+    items = []
+    for key in sorted(params.keys()):
+        if key in ignore:
+            continue
+        values = sorted(value for value in params.getlist(key) if value not in ('', None))
+        items.extend((key, value) for value in values)
+    return '&'.join(f'{key}={value}' for key, value in items)
+
+
+def versioned_key(prefix, *parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'catalog:{prefix}:{inventory_version()}:{digest}'
+
+
+def default_params(params):
+    """Значения по умолчанию не должны плодить разные ключи для одной и той же страницы"""
+    from .queries import default_sort_for
+
+    # Сортировка по умолчанию зависит от поиска: явная -created_at при q - другая страница
+    return {'page': '1', 'sort': default_sort_for(params.get('q', '').strip())}
+
+
+def page_cache_key(request):
+    params = request.GET.copy()
+    for key, default in default_params(params).items():
+        if params.getlist(key) == [default]:
+            del params[key]
+    return versioned_key('page', request.path, normalize_params(params))
+
+
+def cache_anonymous_page(view):
+    """Кэширует GET-ответы для анонимных посетителей до следующего изменения инвентаря"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        response = cache.get(key)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response, settings.CATALOG_PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,71 @@
+"""
+Валидаторы для условных GET-запросов (ETag / Last-Modified).
+
+Валидаторы считаются дешево - по updated_at, дате последней фотографии и версиям
+кэша - и проверяются до рендера шаблона, так что повторный визит получает 304.
+"""
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import availability
+from .cache import inventory_version, inspections_version
+from .metadata import get_catalog_metadata
+from .models import Car
+
+
+def conditional_view(etag_func=None, last_modified_func=None):
+    """condition() из Django плюс Cache-Control: no-cache, чтобы браузер всегда переспрашивал"""
+    def decorator(view):
+        @condition(etag_func=etag_func, last_modified_func=last_modified_func)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def car_validators(request, car_id):
+    """updated_at автомобиля и дата последней фотографии одним запросом, на запрос - один раз"""
+    if not hasattr(request, '_car_validators'):
+        request._car_validators = Car.objects.filter(pk=car_id, is_published=True) \
+                                             .annotate(last_photo=Max('photos__created_at')) \
+                                             .values('updated_at', 'last_photo') \
+                                             .first()
+    return request._car_validators
+
+
+def car_last_modified(request, car_id):
+    validators = car_validators(request, car_id)
+    if validators is None:
+        return None
+    return max(filter(None, (validators['updated_at'], validators['last_photo'])))
+
+
+def car_etag(request, car_id):
+    validators = car_validators(request, car_id)
+    if validators is None:
+        return None
+    last_photo = validators['last_photo'].timestamp() if validators['last_photo'] else 0
+    # Версия инвентаря покрывает опции и характеристики, которые не трогают updated_at
+    return f"car-{car_id}-{validators['updated_at'].timestamp()}-{last_photo}-{inventory_version()}"
+
+
+def metadata_etag(request):
+    return get_catalog_metadata()['etag']
+
+
+def available_times_etag(request):
+    return f"times-{request.GET.get('date', '')}-{inspections_version()}"
+
+
+def availability_etag(request):
+    start, days = availability.parse_range(request.GET)
+    if start is None:
+        return None
+    return f"availability-{start.isoformat()}-{days}-{inspections_version()}"
+
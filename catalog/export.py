@@ -0,0 +1,157 @@
+"""
+Потоковая выгрузка инвентаря для площадок объявлений: CSV, JSON Lines и YML (XML).
+
+Автомобили читаются через iterator(chunk_size) с prefetch фото и опций на каждый чанк,
+а каждый формат - генератор строк, поэтому пиковая память не зависит от размера склада.
+В инкрементальном режиме (since) выгружаются все автомобили, измененные после даты,
+включая снятые с продажи: по полю available площадка понимает, что объявление закрыть.
+Изменения фото и опций идут через update(), поэтому отмечают updated_at сами (CarQuerySet.touch).
+"""
+import csv
+import json
+from datetime import datetime, time
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Car, CarPhoto, Feature
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FORMATS = ('csv', 'jsonl', 'yml')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'yml': 'application/xml; charset=utf-8',
+}
+CSV_COLUMNS = (
+    'id', 'available', 'brand', 'model', 'generation', 'year', 'price', 'mileage', 'color',
+    'country', 'body_type', 'engine_type', 'engine_volume', 'engine_power', 'transmission',
+    'drive', 'condition', 'owners', 'steering', 'description', 'updated_at', 'url', 'photos', 'features',
+)
+YML_PARAMS = (
+    ('year', 'Год выпуска'),
+    ('mileage', 'Пробег'),
+    ('color', 'Цвет'),
+    ('engine_volume', 'Объем двигателя'),
+    ('engine_power', 'Мощность'),
+)
+
+
+def parse_since(value):
+    """Дата или дата-время в ISO 8601 для инкрементальной выгрузки; None, если не разобрать"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(since=None):
+    if since is None:
+        cars = Car.objects.filter(is_published=True, is_sold=False)
+    else:
+        cars = Car.objects.filter(updated_at__gte=since)
+    return cars.order_by('id').prefetch_related(
+        Prefetch('photos', queryset=CarPhoto.objects.order_by('-is_main', 'id')),
+        Prefetch('features', queryset=Feature.objects.order_by('name')),
+    )
+
+
+def car_records(cars, base_url):
+    """Плоские словари для всех форматов; base_url - адрес сайта без завершающего /"""
+    for car in cars.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'id': car.pk,
+            'available': car.is_published and not car.is_sold,
+            'brand': car.brand,
+            'model': car.model,
+            'generation': car.generation,
+            'year': car.year,
+            'price': car.price,
+            'mileage': car.mileage,
+            'color': car.color,
+            'country': car.country,
+            'body_type': car.body_type,
+            'engine_type': car.engine_type,
+            'engine_volume': car.engine_volume,
+            'engine_power': car.engine_power,
+            'transmission': car.transmission,
+            'drive': car.drive,
+            'condition': car.condition,
+            'owners': car.owners,
+            'steering': car.steering,
+            'description': car.description,
+            'updated_at': car.updated_at,
+            'url': base_url + reverse('car_detail', args=[car.pk]),
+            'photos': [base_url + photo.image.url for photo in car.photos.all()],
+            'features': [feature.name for feature in car.features.all()],
+        }
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: write() просто возвращает строку"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        record = dict(record, photos='|'.join(record['photos']), features='|'.join(record['features']))
+        yield writer.writerow([record[column] for column in CSV_COLUMNS])
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def yml_lines(records, base_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<yml_catalog date={quoteattr(timezone.now().strftime("%Y-%m-%dT%H:%M:%S%z"))}>\n<shop>\n'
+    yield f'<name>{escape(settings.SHOWROOM_NAME)}</name>\n<company>{escape(settings.SHOWROOM_NAME)}</company>\n'
+    yield f'<url>{escape(base_url)}/</url>\n'
+    yield '<currencies><currency id="RUR" rate="1"/></currencies>\n'
+    yield '<categories><category id="1">Автомобили с пробегом</category></categories>\n<offers>\n'
+    for record in records:
+        parts = [
+            f'<offer id="{record["id"]}" available="{"true" if record["available"] else "false"}">',
+            f'<url>{escape(record["url"])}</url>',
+            f'<price>{record["price"]}</price>',
+            '<currencyId>RUR</currencyId>',
+            '<categoryId>1</categoryId>',
+        ]
+        parts += [f'<picture>{escape(url)}</picture>' for url in record['photos']]
+        parts += [
+            f'<name>{escape(record["brand"])} {escape(record["model"])}</name>',
+            f'<vendor>{escape(record["brand"])}</vendor>',
+            f'<model>{escape(record["model"])}</model>',
+            f'<description>{escape(record["description"])}</description>',
+        ]
+        parts += [f'<param name={quoteattr(label)}>{escape(str(record[field]))}</param>' for field, label in YML_PARAMS]
+        parts += [f'<param name="Опция">{escape(name)}</param>' for name in record['features']]
+        parts.append('</offer>\n')
+        yield ''.join(parts)
+    yield '</offers>\n</shop>\n</yml_catalog>\n'
+
+
+def export_lines(export_format, base_url, since=None):
+    records = car_records(export_queryset(since), base_url.rstrip('/'))
+    if export_format == 'csv':
+        return csv_lines(records)
+    if export_format == 'jsonl':
+        return jsonl_lines(records)
+    if export_format == 'yml':
+        return yml_lines(records, base_url.rstrip('/'))
+    raise ValueError(f'Неизвестный формат выгрузки: {export_format}')
@@ -0,0 +1,59 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache import normalize_params, versioned_key
+from .forms import CarFilterForm
+from .models import Car
+
+FACET_FIELDS = ('brand', 'country', 'transmission', 'engine_type', 'body_type')
+FACETS_TIMEOUT = 60 * 60
+# Параметры, которые не влияют на набор автомобилей
+NON_FILTER_PARAMS = ('page', 'sort', 'cursor', 'paging')
+
+
+def year_bucket(year):
+    """Значение из CarFilterForm.YEAR_CHOICES, в которое попадает год"""
+    for value, _label in CarFilterForm.YEAR_CHOICES:
+        if not value:
+            continue
+        start, end = value.split('-')
+        if (not start or year >= int(start)) and (not end or year <= int(end)):
+            return value
+    return None
+
+
+def compute_facets(cars):
+    """Счетчики для сайдбара по отфильтрованному queryset: два агрегирующих запроса"""
+    # Фильтр по опциям делает JOIN + DISTINCT, поэтому считаем по id через подзапрос
+    car_ids = cars.order_by().values('pk')
+    base = Car.objects.filter(pk__in=car_ids)
+
+    facets = {field: Counter() for field in FACET_FIELDS}
+    facets['year_range'] = Counter()
+    rows = base.order_by().values(*FACET_FIELDS, 'year').annotate(total=Count('id'))
+    for row in rows:
+        for field in FACET_FIELDS:
+            facets[field][row[field]] += row['total']
+        bucket = year_bucket(row['year'])
+        if bucket:
+            facets['year_range'][bucket] += row['total']
+
+    through = Car.features.through
+    feature_rows = through.objects.filter(car__in=car_ids) \
+                                  .values('feature_id') \
+                                  .annotate(total=Count('car_id'))
+    facets['features'] = Counter({row['feature_id']: row['total'] for row in feature_rows})
+
+    return {name: dict(counts) for name, counts in facets.items()}
+
+
+def get_facets(cars, params):
+    """Счетчики из кэша; ключ - нормализованные фильтры и версия инвентаря"""
+    key = versioned_key('facets', normalize_params(params, ignore=NON_FILTER_PARAMS))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(cars)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
@@ -0,0 +1,68 @@
+"""
+Денормализованная битовая маска опций автомобиля.
+
+Каждой опции выдается свой бит (Feature.bit, 0..62), у автомобиля в Car.feature_mask
+взведены биты всех его опций. Фильтр "есть все выбранные опции" становится одним
+условием feature_mask & wanted = wanted без JOIN и DISTINCT. Опции, которым бит не
+достался (их больше 63), проверяются отдельным JOIN на каждую.
+"""
+from django.db.models import F
+
+MASK_BITS = 63
+
+
+def next_free_bit(feature_model):
+    used = set(feature_model.objects.exclude(bit=None).values_list('bit', flat=True))
+    for bit in range(MASK_BITS):
+        if bit not in used:
+            return bit
+    return None
+
+
+def mask_for(feature_ids):
+    """(маска, id опций без бита) для списка id опций"""
+    from .models import Feature
+
+    mask = 0
+    bits = dict(Feature.objects.filter(pk__in=feature_ids).values_list('pk', 'bit'))
+    overflow = []
+    for feature_id in feature_ids:
+        bit = bits.get(feature_id)
+        if bit is None:
+            overflow.append(feature_id)
+        else:
+            mask |= 1 << bit
+    return mask, overflow
+
+
+def filter_all_features(cars, feature_ids):
+    """Автомобили, у которых есть все перечисленные опции"""
+    mask, overflow = mask_for(feature_ids)
+    if mask:
+        cars = cars.alias(feature_hits=F('feature_mask').bitand(mask)).filter(feature_hits=mask)
+    for feature_id in overflow:
+        # Каждый filter по m2m - отдельный JOIN с одной строкой на автомобиль, DISTINCT не нужен
+        cars = cars.filter(features=feature_id)
+    return cars
+
+
+def refresh_masks(car_ids):
+    """Пересчитывает feature_mask для автомобилей; update() не вызывает сигналов сохранения"""
+    from .models import Car
+
+    car_ids = list(car_ids)
+    masks = dict.fromkeys(car_ids, 0)
+    links = Car.features.through.objects.filter(car_id__in=car_ids, feature__bit__isnull=False) \
+                                        .values_list('car_id', 'feature__bit')
+    for car_id, bit in links:
+        masks[car_id] |= 1 << bit
+    for car_id, mask in masks.items():
+        Car.objects.filter(pk=car_id).touch(feature_mask=mask)
+
+
+def clear_bit(bit):
+    from .models import Car
+
+    flag = 1 << bit
+    Car.objects.alias(flag_set=F('feature_mask').bitand(flag)).filter(flag_set=flag) \
+               .touch(feature_mask=F('feature_mask').bitand(~flag))
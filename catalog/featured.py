@@ -0,0 +1,55 @@
+"""
+Случайные автомобили для главной без выборки всего инвентаря.
+
+Пул из FEATURED_POOL_SIZE id набирается случайными пробами по диапазону первичного
+ключа (каждая проба - поиск по индексу) и хранится в кэше до изменения инвентаря
+или до истечения CATALOG_FEATURED_POOL_TIMEOUT. Главная берет из пула случайные 6.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Max
+
+from .cache import versioned_key
+from .models import Car
+from .queries import published_cars
+
+FEATURED_POOL_SIZE = 36
+
+
+def build_pool(size=FEATURED_POOL_SIZE, rng=random):
+    cars = published_cars().order_by('id').values_list('id', flat=True)
+    # Маленький инвентарь целиком помещается в пул
+    head = list(cars[:size + 1])
+    if len(head) <= size:
+        return head
+
+    bounds = Car.objects.aggregate(low=Min('id'), high=Max('id'))
+    pool = set()
+    for _ in range(size * 3):
+        if len(pool) >= size:
+            break
+        probe = rng.randint(bounds['low'], bounds['high'])
+        car_id = cars.filter(id__gte=probe).first()
+        if car_id is None:
+            car_id = cars.filter(id__lt=probe).first()
+        if car_id is None:
+            # Опубликованных автомобилей нет вовсе
+            break
+        pool.add(car_id)
+    return list(pool)
+
+
+def featured_pool():
+    key = versioned_key('featured-pool')
+    pool = cache.get(key)
+    if pool is None:
+        pool = build_pool()
+        cache.set(key, pool, settings.CATALOG_FEATURED_POOL_TIMEOUT)
+    return pool
+
+
+def featured_car_ids(count=6):
+    pool = featured_pool()
+    return random.sample(pool, min(count, len(pool)))
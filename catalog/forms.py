@@ -1,6 +1,9 @@
 from django import forms
 from django.core.validators import RegexValidator
 from .models import PurchaseAgreementRequest, Car, Feature, InspectionRequest
+from .availability import is_working_day
+from .metadata import brand_names, model_names
+from .photos import add_photos, validate_photos
 from django.core.exceptions import ValidationError
 import re
 from django.utils import timezone
@@ -121,6 +124,16 @@ class PurchaseAgreementForm(forms.ModelForm):
         return number
 
 class CarFilterForm(forms.Form):
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Марка, модель, опции...'
+        }),
+        label='Поиск'
+    )
+
     min_price = forms.IntegerField(
         required=False,
         widget=forms.NumberInput(attrs={
@@ -140,6 +153,10 @@ class CarFilterForm(forms.Form):
         }),
         label='Цена до'
     )
+
+    # Без виджета в сайдбаре: приходят из ссылок быстрых фильтров на главной и из API
+    min_year = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput, label='Год от')
+    max_mileage = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput, label='Пробег до')
     
     YEAR_CHOICES = [
         ('', 'Любой год'),
@@ -202,6 +219,13 @@ class CarFilterForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-select'}),
         label='Тип двигателя'
     )
+
+    body_type = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Любой')] + Car.BODY_TYPE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Тип кузова'
+    )
     features = forms.ModelMultipleChoiceField(
         required=False,
         queryset=Feature.objects.all(),
@@ -246,24 +270,29 @@ class CarFilterForm(forms.Form):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        brands = Car.objects.filter(is_published=True, is_sold=False) \
-                          .values_list('brand', flat=True) \
-                          .distinct() \
-                          .order_by('brand')
-        
+        brands = brand_names()
         brand_choices = [('', 'Любая марка')] + [(brand, brand) for brand in brands]
         self.fields['brand'].choices = brand_choices
         
         selected_brand = self.data.get('brand') if self.data else None
         if selected_brand:
-            models = Car.objects.filter(brand=selected_brand, is_published=True, is_sold=False) \
-                              .values_list('model', flat=True) \
-                              .distinct() \
-                              .order_by('model')
+            models = model_names(selected_brand)
             model_choices = [('', 'Любая модель')] + [(model, model) for model in models]
             self.fields['model'].choices = model_choices
             self.fields['model'].widget.attrs.pop('disabled', None)
 
+    def apply_facets(self, facets):
+        """Добавляет к вариантам фильтров количество подходящих автомобилей"""
+        for name in ('brand', 'year_range', 'transmission', 'engine_type', 'body_type', 'country'):
+            counts = facets.get(name, {})
+            self.fields[name].choices = [
+                (value, f'{label} ({counts.get(value, 0)})' if value else label)
+                for value, label in self.fields[name].choices
+            ]
+        feature_counts = facets.get('features', {})
+        self.fields['features'].label_from_instance = \
+            lambda feature: f'{feature.name} ({feature_counts.get(feature.pk, 0)})'
+
 class InspectionRequestForm(forms.ModelForm):
     phone = forms.CharField(
         max_length=20,
@@ -317,7 +346,7 @@ class InspectionRequestForm(forms.ModelForm):
         if date < datetime.date.today():
             raise forms.ValidationError("Нельзя выбрать прошедшую дату")
         
-        if date.weekday() >= 5:
+        if not is_working_day(date):
             raise forms.ValidationError("Автосалон не работает по выходным. Пожалуйста, выберите будний день.")
             
         return date
@@ -391,7 +420,15 @@ class CarPhotoUploadForm(forms.Form):
         label="Загрузить несколько фотографий"
     )
 
-    def save_photos(self, car):
+    def __init__(self, *args, car=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.car = car
+        self.fields['images'].widget.attrs['accept'] = 'image/jpeg,image/png,image/webp'
+
+    def clean_images(self):
         images = self.files.getlist('images')
-        for image in images:
-            CarPhoto.objects.create(car=car, image=image)
\ No newline at end of file
+        validate_photos(self.car, images)
+        return images
+
+    def save_photos(self, car):
+        return add_photos(car, self.cleaned_data['images'])
@@ -0,0 +1,202 @@
+"""
+Массовый импорт автомобилей из CSV и JSON Lines (формат совпадает с export_inventory).
+
+Строка файла - полное описание автомобиля: если указан id существующего автомобиля,
+он перезаписывается, иначе создается новый. Все строки сначала проверяются, и при
+ошибках ничего не пишется. Запись идет через bulk_create/bulk_update и пачки строк
+промежуточных таблиц в одной транзакции; сигналы сохранения при этом не срабатывают,
+поэтому маски опций, полнотекстовый индекс и версия инвентаря обновляются здесь же.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import search
+from .cache import bump_cars_version
+from .feature_mask import MASK_BITS
+from .inventory_index import inventory_index, is_enabled as inventory_index_enabled
+from .models import Car, Feature, Characteristic
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FIELDS = (
+    'brand', 'model', 'generation', 'price', 'year', 'mileage', 'color', 'body_type',
+    'engine_type', 'engine_volume', 'engine_power', 'transmission', 'drive', 'condition',
+    'owners', 'documents', 'steering', 'description', 'is_sold', 'is_published',
+)
+# Поля, которые не проверяются по строке: вычисляются при записи или ставятся автоматически
+NOT_VALIDATED = ('id', 'country', 'feature_mask', 'created_at', 'updated_at')
+
+
+class ImportFailed(Exception):
+    def __init__(self, errors):
+        super().__init__(f'Ошибок в файле: {len(errors)}')
+        self.errors = errors
+
+
+def read_rows(file, import_format):
+    """Пары (номер строки, словарь) из открытого файла"""
+    if import_format == 'csv':
+        for reader_line, row in enumerate(csv.DictReader(file), start=2):
+            yield reader_line, row
+    elif import_format == 'jsonl':
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, json.loads(line)
+    else:
+        raise ValueError(f'Неизвестный формат импорта: {import_format}')
+
+
+def split_list(value):
+    """Список из CSV-ячейки вида "a|b|c" или готового списка из JSON"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split('|') if item.strip()]
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def split_characteristics(value):
+    """Пары (название, значение) из "Название: значение|..." или словаря из JSON"""
+    if isinstance(value, dict):
+        return [(str(name).strip(), str(item).strip()) for name, item in value.items()]
+    pairs = []
+    for item in split_list(value):
+        name, _, item_value = item.partition(':')
+        if name.strip():
+            pairs.append((name.strip(), item_value.strip()))
+    return pairs
+
+
+def build_car(row):
+    """Автомобиль из строки файла, еще не сохраненный; ValidationError, если строка некорректна"""
+    car = Car(**{field: row[field] for field in IMPORT_FIELDS if row.get(field) not in (None, '')})
+    if row.get('id') not in (None, ''):
+        try:
+            car.pk = int(row['id'])
+        except (TypeError, ValueError):
+            raise ValidationError({'id': ['Некорректный id']})
+    car.clean_fields(exclude=NOT_VALIDATED)
+    return car
+
+
+def upsert_features(names):
+    """{название: опция}; недостающие опции создаются одним bulk_create со свободными битами"""
+    features = {}
+    for feature in Feature.objects.filter(name__in=names).order_by('-pk'):
+        features[feature.name] = feature
+    missing = [name for name in names if name not in features]
+    if missing:
+        used = set(Feature.objects.exclude(bit=None).values_list('bit', flat=True))
+        free = (bit for bit in range(MASK_BITS) if bit not in used)
+        created = Feature.objects.bulk_create([Feature(name=name, bit=next(free, None)) for name in missing])
+        features.update((feature.name, feature) for feature in created)
+    return features
+
+
+def upsert_characteristics(pairs):
+    """{(название, значение): характеристика}; недостающие создаются одним bulk_create"""
+    characteristics = {}
+    existing = Characteristic.objects.filter(name__in={name for name, _ in pairs}).order_by('-pk')
+    for characteristic in existing:
+        characteristics[(characteristic.name, characteristic.value)] = characteristic
+    missing = [pair for pair in pairs if pair not in characteristics]
+    if missing:
+        created = Characteristic.objects.bulk_create([Characteristic(name=name, value=value) for name, value in missing])
+        characteristics.update(((item.name, item.value), item) for item in created)
+    return characteristics
+
+
+def replace_links(through, column, target_column, links, car_ids, batch_size):
+    """
+    Перезаписывает связи автомобилей в промежуточной таблице пачками. Строки вставляются
+    через executemany без экземпляров модели: на 50 тыс. автомобилей это сотни тысяч связей.
+    """
+    car_ids = list(car_ids)
+    for start in range(0, len(car_ids), batch_size):
+        through.objects.filter(**{f'{column}__in': car_ids[start:start + batch_size]}).delete()
+    sql = 'INSERT INTO {} ({}, {}) VALUES (%s, %s)'.format(
+        connection.ops.quote_name(through._meta.db_table),
+        connection.ops.quote_name(column),
+        connection.ops.quote_name(target_column),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(links), batch_size):
+            cursor.executemany(sql, links[start:start + batch_size])
+
+
+def import_cars(rows, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Импортирует строки [(номер строки, словарь)]. Возвращает (создано, обновлено).
+    При ошибках в строках выбрасывает ImportFailed со списком "строка N: поле: сообщение".
+    """
+    parsed, errors = [], []
+    for line_number, row in rows:
+        try:
+            car = build_car(row)
+        except ValidationError as error:
+            for field, messages in error.message_dict.items():
+                errors.extend(f'строка {line_number}: {field}: {message}' for message in messages)
+            continue
+        features = split_list(row['features']) if 'features' in row else None
+        characteristics = split_characteristics(row['characteristics']) if 'characteristics' in row else None
+        parsed.append((car, features, characteristics))
+    if errors:
+        raise ImportFailed(errors)
+    if dry_run:
+        return 0, 0
+
+    with transaction.atomic():
+        feature_names = list(dict.fromkeys(name for _, names, _ in parsed for name in names or ()))
+        features = upsert_features(feature_names)
+        pairs = list(dict.fromkeys(pair for _, _, items in parsed for pair in items or ()))
+        characteristics = upsert_characteristics(pairs)
+
+        ids = [car.pk for car, _, _ in parsed if car.pk is not None]
+        existing = set()
+        for start in range(0, len(ids), batch_size):
+            existing.update(Car.objects.filter(pk__in=ids[start:start + batch_size]).values_list('pk', flat=True))
+
+        now = timezone.now()
+        # Обновляемые автомобили без колонки опций сохраняют свою маску
+        to_create, to_update, to_update_masked = [], [], []
+        for car, names, _ in parsed:
+            if names is not None:
+                for name in names:
+                    if features[name].bit is not None:
+                        car.feature_mask |= 1 << features[name].bit
+            if car.pk not in existing:
+                to_create.append(car)
+            else:
+                car.updated_at = now
+                (to_update if names is None else to_update_masked).append(car)
+
+        Car.objects.bulk_create(to_create, batch_size=batch_size)
+        update_fields = list(IMPORT_FIELDS) + ['updated_at']
+        Car.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+        Car.objects.bulk_update(to_update_masked, update_fields + ['feature_mask'], batch_size=batch_size)
+
+        replace_links(
+            Car.features.through, 'car_id', 'feature_id',
+            [(car.pk, features[name].pk) for car, names, _ in parsed for name in dict.fromkeys(names or ())],
+            [car.pk for car, names, _ in parsed if names is not None and car.pk in existing],
+            batch_size,
+        )
+        replace_links(
+            Car.characteristics.through, 'car_id', 'characteristic_id',
+            [(car.pk, characteristics[pair].pk) for car, _, items in parsed for pair in dict.fromkeys(items or ())],
+            [car.pk for car, _, items in parsed if items is not None and car.pk in existing],
+            batch_size,
+        )
+
+        car_ids = [car.pk for car, _, _ in parsed]
+        for start in range(0, len(car_ids), batch_size):
+            search.index_cars(car_ids[start:start + batch_size])
+        bump_cars_version()
+        if inventory_index_enabled():
+            # Версия ушла вперед - индекс перестроится целиком при следующем чтении
+            inventory_index.apply_change(None)
+
+    return len(to_create), len(to_update) + len(to_update_masked)
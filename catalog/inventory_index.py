@@ -0,0 +1,213 @@
+"""
+Колоночный индекс опубликованного инвентаря в памяти процесса.
+
+Опубликованные и непроданные автомобили хранятся как массивы NumPy, фильтры
+CarFilterForm считаются векторными масками, сортировки - через lexsort. Наружу
+отдаются только id автомобилей страницы, которые затем выбираются одним id__in.
+
+Индекс включается настройкой CATALOG_INVENTORY_INDEX и требует numpy; без него
+каталог работает через ORM как раньше.
+"""
+import threading
+
+from django.conf import settings
+
+from .cache import cars_version
+from .models import Car
+
+try:
+    import numpy as np
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+CATEGORY_FIELDS = ('brand', 'model', 'country', 'transmission', 'engine_type', 'body_type')
+NUMERIC_FIELDS = ('price', 'year', 'mileage')
+VALUE_FIELDS = ('id',) + NUMERIC_FIELDS + ('created_at',) + CATEGORY_FIELDS
+
+
+def is_enabled():
+    return np is not None and getattr(settings, 'CATALOG_INVENTORY_INDEX', False)
+
+
+class InventoryIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.synced_version = None
+        self.size = 0
+        self.rows = {}
+        self.vocab = {field: {} for field in CATEGORY_FIELDS}
+        self.feature_bits = {}
+        self.columns = {}
+        self.features = None
+
+    def _allocate(self, capacity, words):
+        columns = {'id': np.zeros(capacity, dtype=np.int64), 'created_at': np.zeros(capacity, dtype=np.int64)}
+        for field in NUMERIC_FIELDS:
+            columns[field] = np.zeros(capacity, dtype=np.int64)
+        for field in CATEGORY_FIELDS:
+            columns[field] = np.zeros(capacity, dtype=np.int32)
+        return columns, np.zeros((capacity, words), dtype=np.uint64)
+
+    def _grow(self, capacity=None, words=None):
+        capacity = capacity or max(16, len(self.columns['id']) * 2)
+        words = words or self.features.shape[1]
+        columns, features = self._allocate(capacity, words)
+        for field, column in self.columns.items():
+            columns[field][:self.size] = column[:self.size]
+        features[:self.size, :self.features.shape[1]] = self.features[:self.size]
+        self.columns, self.features = columns, features
+
+    def _code(self, field, value):
+        vocab = self.vocab[field]
+        if value not in vocab:
+            vocab[value] = len(vocab)
+        return vocab[value]
+
+    def _bit(self, feature_id):
+        if feature_id not in self.feature_bits:
+            self.feature_bits[feature_id] = len(self.feature_bits)
+            words = len(self.feature_bits) // 64 + 1
+            if words > self.features.shape[1]:
+                self._grow(capacity=len(self.columns['id']), words=words)
+        return self.feature_bits[feature_id]
+
+    def _write_row(self, row, values):
+        for field, value in zip(VALUE_FIELDS, values):
+            if field == 'created_at':
+                value = int(value.timestamp() * 1_000_000)
+            elif field in CATEGORY_FIELDS:
+                value = self._code(field, value)
+            self.columns[field][row] = value
+
+    def _set_features(self, row, feature_ids):
+        self.features[row] = 0
+        for feature_id in feature_ids:
+            bit = self._bit(feature_id)
+            self.features[row, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def rebuild(self):
+        """Полная перестройка из базы: два запроса"""
+        with self.lock:
+            version = cars_version()
+            cars = Car.objects.filter(is_published=True, is_sold=False).order_by()
+            values = list(cars.values_list(*VALUE_FIELDS))
+            links = Car.features.through.objects.filter(car__in=cars.values('pk')).values_list('car_id', 'feature_id')
+
+            self.size = 0
+            self.rows = {}
+            self.vocab = {field: {} for field in CATEGORY_FIELDS}
+            self.feature_bits = {}
+            self.columns, self.features = self._allocate(max(16, len(values)), 1)
+            for row, car_values in enumerate(values):
+                self._write_row(row, car_values)
+                self.rows[car_values[0]] = row
+            self.size = len(values)
+
+            car_features = {}
+            for car_id, feature_id in links:
+                car_features.setdefault(car_id, []).append(feature_id)
+            for car_id, feature_ids in car_features.items():
+                self._set_features(self.rows[car_id], feature_ids)
+
+            self.synced_version = version
+
+    def _remove(self, car_id):
+        row = self.rows.pop(car_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            # Последнюю строку переносим на место удаленной
+            for column in self.columns.values():
+                column[row] = column[last]
+            self.features[row] = self.features[last]
+            self.rows[int(self.columns['id'][row])] = row
+        self.size = last
+
+    def _refresh_car(self, car_id):
+        values = Car.objects.filter(pk=car_id, is_published=True, is_sold=False).values_list(*VALUE_FIELDS).first()
+        if values is None:
+            self._remove(car_id)
+            return
+        row = self.rows.get(car_id)
+        if row is None:
+            if self.size == len(self.columns['id']):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[car_id] = row
+        self._write_row(row, values)
+        feature_ids = Car.features.through.objects.filter(car_id=car_id).values_list('feature_id', flat=True)
+        self._set_features(row, feature_ids)
+
+    def apply_change(self, car_ids):
+        """Инкрементальное обновление по сигналу. Если версия ушла дальше, индекс перестроится при чтении"""
+        with self.lock:
+            if self.synced_version is None:
+                return
+            version = cars_version()
+            if car_ids is None or version != self.synced_version + 1:
+                self.synced_version = None
+                return
+            for car_id in car_ids:
+                self._refresh_car(car_id)
+            self.synced_version = version
+
+    def ensure_fresh(self):
+        with self.lock:
+            if self.synced_version != cars_version():
+                self.rebuild()
+
+    def _mask(self, criteria):
+        n = self.size
+        mask = np.ones(n, dtype=bool)
+        for lookup, value in criteria:
+            field, _, op = lookup.partition('__')
+            if field == 'features':
+                wanted = np.zeros(self.features.shape[1], dtype=np.uint64)
+                for feature_id in value:
+                    bit = self.feature_bits.get(feature_id)
+                    if bit is None:
+                        # Опции нет ни у одного автомобиля - под "все опции" не подходит никто
+                        mask[:] = False
+                        break
+                    wanted[bit // 64] |= np.uint64(1 << (bit % 64))
+                mask &= ((self.features[:n] & wanted) == wanted).all(axis=1)
+                continue
+
+            column = self.columns[field][:n]
+            if field in CATEGORY_FIELDS:
+                vocab = self.vocab[field]
+                values = value if op == 'in' else [value]
+                codes = [vocab[v] for v in values if v in vocab]
+                mask &= np.isin(column, codes)
+            elif op == 'lte':
+                mask &= column <= value
+            elif op == 'gte':
+                mask &= column >= value
+            elif op == 'range':
+                mask &= (column >= value[0]) & (column <= value[1])
+            else:
+                mask &= column == value
+        return mask
+
+    def search(self, criteria, sort):
+        """Отсортированные id автомобилей, подходящих под условия car_list_criteria"""
+        self.ensure_fresh()
+        with self.lock:
+            rows = np.flatnonzero(self._mask(criteria))
+            field = sort.lstrip('-')
+            keys = self.columns[field][rows]
+            ids = self.columns['id'][rows]
+            if sort.startswith('-'):
+                order = np.lexsort((-ids, -keys))
+            else:
+                order = np.lexsort((ids, keys))
+            return ids[order]
+
+
+inventory_index = InventoryIndex()
+
+
+def search_car_ids(criteria, sort):
+    return inventory_index.search(criteria, sort)
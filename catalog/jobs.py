@@ -0,0 +1,27 @@
+"""Обработчики фоновых задач; регистрируются при старте приложения из CatalogConfig.ready()"""
+from . import renditions
+from .agreement_store import ensure_pdf
+from .models import CarPhoto, PurchaseAgreementRequest
+from .tasks import task
+
+
+@task('catalog.render_photo', max_attempts=3, timeout=120)
+def render_photo(photo_id):
+    photo = CarPhoto.objects.filter(pk=photo_id).first()
+    # Фото могли удалить или уже обработать, пока задача ждала в очереди
+    if photo is None or photo.has_renditions:
+        return
+    # Одинаковые фотографии лежат одним файлом - копии могли уже сделать для другой
+    if CarPhoto.objects.filter(image=photo.image.name, has_renditions=True).exists():
+        CarPhoto.objects.filter(pk=photo.pk).update(has_renditions=True)
+        return
+    renditions.render_photo(photo)
+
+
+# Рендер PDF занимает процессор целиком: не больше двух одновременно на все воркеры,
+# чтобы всплеск договоров не отнял процессор у сайта
+@task('catalog.render_agreement', max_attempts=3, timeout=120, concurrency=2)
+def render_agreement(agreement_id):
+    agreement = PurchaseAgreementRequest.objects.select_related('car').get(pk=agreement_id)
+    # Рендерит, только если под текущие данные и бланк файла еще нет
+    ensure_pdf(agreement)
@@ -0,0 +1,74 @@
+"""Синтетический инвентарь для бенчмарков. Все команды пишут его внутри транзакции и откатывают."""
+import random
+
+from django.db import transaction
+
+from catalog.models import Car, Feature
+
+MODELS = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4', 'Land Cruiser'],
+    'Nissan': ['Qashqai', 'X-Trail', 'Almera'],
+    'BMW': ['3 Series', '5 Series', 'X5'],
+    'Mercedes': ['C-Class', 'E-Class', 'GLE'],
+    'Hyundai': ['Solaris', 'Creta', 'Tucson'],
+    'Kia': ['Rio', 'Sportage', 'Ceed'],
+    'Lada': ['Vesta', 'Granta', 'Niva'],
+    'Ford': ['Focus', 'Mondeo', 'Explorer'],
+}
+
+
+def choice_values(choices):
+    return [value for value, _label in choices]
+
+
+def populate(count, batch_size=5000, seed=42):
+    """Создает count автомобилей и связи с опциями через bulk_create"""
+    rng = random.Random(seed)
+    features = list(Feature.objects.all())
+    # Через save(), чтобы опции получили биты маски
+    features += [Feature.objects.create(name=f'Опция {i}', category='Комфорт') for i in range(16 - len(features))]
+    through = Car.features.through
+    brands = list(MODELS)
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        cars, car_features = [], []
+        for _ in range(size):
+            brand = rng.choice(brands)
+            chosen = rng.sample(features, rng.randint(0, 5))
+            car_features.append(chosen)
+            cars.append(Car(
+                brand=brand, model=rng.choice(MODELS[brand]),
+                price=rng.randrange(200000, 8000000, 10000), year=rng.randint(2000, 2024),
+                mileage=rng.randrange(0, 300000, 1000), color='Белый',
+                body_type=rng.choice(choice_values(Car.BODY_TYPE_CHOICES)),
+                engine_type=rng.choice(choice_values(Car.ENGINE_TYPE_CHOICES)),
+                engine_volume=rng.choice([1.6, 2.0, 2.5, 3.0]), engine_power=rng.randint(90, 400),
+                transmission=rng.choice(choice_values(Car.TRANSMISSION_CHOICES)),
+                drive=rng.choice(choice_values(Car.DRIVE_CHOICES)),
+                is_sold=rng.random() < 0.1,
+                feature_mask=sum(1 << feature.bit for feature in chosen if feature.bit is not None),
+            ))
+        cars = Car.objects.bulk_create(cars)
+        through.objects.bulk_create([
+            through(car_id=car.pk, feature_id=feature.pk)
+            for car, chosen in zip(cars, car_features) for feature in chosen
+        ])
+        created += size
+    return features
+
+
+class Rollback(Exception):
+    pass
+
+
+def in_rollback(func, *args, **kwargs):
+    """Выполняет func в транзакции и откатывает ее, возвращая результат"""
+    result = None
+    try:
+        with transaction.atomic():
+            result = func(*args, **kwargs)
+            raise Rollback
+    except Rollback:
+        pass
+    return result
@@ -0,0 +1,84 @@
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from catalog import agreement_pdf
+from catalog.models import Car, PurchaseAgreementRequest
+
+
+def sample_agreement():
+    car = Car(brand='Toyota', model='Camry', year=2018, price=1850000, mileage=64000, color='Белый')
+    return PurchaseAgreementRequest(
+        car=car,
+        seller_full_name='Петров Петр Петрович', seller_passport_series='0101', seller_passport_number='123456',
+        seller_passport_issued='ОВД г. Барнаула', seller_registration_address='г. Барнаул, ул. Ленина, 1',
+        buyer_full_name='Иванов Иван Иванович', buyer_passport_series='0202', buyer_passport_number='654321',
+        buyer_passport_issued='ОВД г. Бийска', buyer_registration_address='г. Бийск, ул. Мира, 2',
+        car_brand=car.brand, car_model=car.model, car_year=car.year, car_price=car.price,
+        car_vin='JTNB11HK0J3000000', car_license_plate='А123ВС22',
+    )
+
+
+def render_uncached(agreement):
+    """Прежний путь: бланк и шрифты разбираются на каждый договор, слой сливается через merge_page"""
+    page = PdfReader(agreement_pdf.static_path('dkp.pdf')).pages[0]
+    font_name = agreement_pdf.load_fonts(*agreement_pdf.fonts.paths())
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    agreement_pdf.draw_overlay(can, agreement, font_name)
+    can.save()
+    packet.seek(0)
+    page.merge_page(PdfReader(packet).pages[0])
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Command(BaseCommand):
+    help = 'Задержка (p50/p99) и пик памяти рендера договора: с разбором бланка и шрифтов на каждый PDF и с кэшем'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        agreement = sample_agreement()
+        repeat = options['repeat']
+        self.stdout.write(f'{"режим":<24} {"p50, мс":>9} {"p99, мс":>9} {"пик памяти, МБ":>16}')
+        self.report('без кэша (как было)', lambda: render_uncached(agreement), repeat)
+        # Первый договор в процессе разбирает бланк и шрифты, дальше - только слой с данными
+        render = lambda: agreement_pdf.render_agreement_pdf(agreement)
+        self.report('первый договор', render, min(repeat, 10), before=agreement_pdf.reset_caches)
+        self.report('с кэшем', render, repeat)
+
+    def report(self, label, render, repeat, before=None):
+        samples = []
+        for _ in range(repeat):
+            if before:
+                before()
+            start = time.perf_counter()
+            render()
+            samples.append((time.perf_counter() - start) * 1000)
+        # Память отдельным прогоном: под tracemalloc время искажается в разы
+        if before:
+            before()
+        tracemalloc.start()
+        render()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{label:<24} {statistics.median(samples):>9.1f} {percentile(samples, 0.99):>9.1f} '
+            f'{peak / 1024 / 1024:>16.1f}'
+        )
@@ -0,0 +1,54 @@
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from catalog.featured import featured_car_ids
+from catalog.queries import published_cars, car_cards, cars_in_order
+from catalog.views import index
+from ._synthetic import populate, in_rollback
+
+
+def sample_by_materializing():
+    """Прежний способ: загрузить весь инвентарь и выбрать 6"""
+    all_cars = list(published_cars())
+    return random.sample(all_cars, min(6, len(all_cars)))
+
+
+class Command(BaseCommand):
+    help = 'Задержка главной страницы и выбора случайных авто на разных объемах инвентаря'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"авто":>10} {"старый выбор, мс":>18} {"пул (холодный), мс":>20} '
+                          f'{"пул (теплый), мс":>18} {"главная, мс":>13}')
+        for size in options['sizes']:
+            in_rollback(self.run_size, size, options['repeat'])
+
+    def timed(self, func, repeat, before=None):
+        samples = []
+        for _ in range(repeat):
+            if before:
+                before()
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def run_size(self, size, repeat):
+        populate(size)
+        # Главная без кэша страниц: меряем саму выборку и рендер
+        view = index.__wrapped__
+        request = RequestFactory().get('/')
+
+        old_ms = self.timed(sample_by_materializing, min(repeat, 3))
+        cold_ms = self.timed(lambda: featured_car_ids(6), repeat, before=cache.clear)
+        warm_ms = self.timed(lambda: cars_in_order(car_cards(), featured_car_ids(6)), repeat)
+        page_ms = self.timed(lambda: view(request), repeat)
+        self.stdout.write(f'{size:>10} {old_ms:>18.2f} {cold_ms:>20.2f} {warm_ms:>18.2f} {page_ms:>13.2f}')
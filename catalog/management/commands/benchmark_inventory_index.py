@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from catalog.forms import CarFilterForm
+from catalog.inventory_index import InventoryIndex, np
+from catalog.queries import filter_car_list, car_list_criteria, cars_in_order, car_cards
+from ._synthetic import populate, in_rollback
+
+QUERIES = [
+    '',
+    'sort=price',
+    'brand=Toyota&sort=-year',
+    'brand=BMW&model=X5&sort=mileage',
+    'min_price=1000000&max_price=3000000&sort=-price',
+    'year_range=2015-2019&transmission=automatic',
+    'country=germany&engine_type=diesel&sort=year',
+    'body_type=suv&max_mileage=50000',
+    'features={feature}&sort=price',
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает фильтрацию каталога через ORM и через колоночный индекс в памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('Для индекса нужен numpy: pip install numpy')
+        for size in options['sizes']:
+            in_rollback(self.run_size, size, options['repeat'])
+
+    def timed(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def run_size(self, size, repeat):
+        started = time.perf_counter()
+        features = populate(size)
+        self.stdout.write(f'\n{size} автомобилей (генерация {time.perf_counter() - started:.1f} с)')
+
+        index = InventoryIndex()
+        build_ms = self.timed(index.rebuild, 1)
+        self.stdout.write(f'  построение индекса: {build_ms:.0f} мс')
+        self.stdout.write(f'  {"запрос":<50} {"ORM, мс":>10} {"индекс, мс":>12} {"из них маска+сортировка":>25}')
+
+        for query in QUERIES:
+            params = QueryDict(query.format(feature=features[0].pk))
+            form = CarFilterForm(params or None)
+            form.is_valid()
+            criteria, sort = car_list_criteria(params, form)
+
+            def orm_page():
+                cars = filter_car_list(car_cards(), params, form)
+                cars.count()
+                list(cars[:12])
+
+            def index_page():
+                ids = index.search(criteria, sort)
+                len(ids)
+                cars_in_order(car_cards(), ids[:12].tolist())
+
+            orm_ms = self.timed(orm_page, repeat)
+            index_ms = self.timed(index_page, repeat)
+            search_ms = self.timed(lambda: index.search(criteria, sort), repeat)
+            self.stdout.write(
+                f'  {query or "(без фильтров)":<50} {orm_ms:>10.2f} {index_ms:>12.2f} {search_ms:>25.3f}'
+            )
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+
+from catalog.forms import CarFilterForm
+from catalog.models import Feature
+from catalog.queries import published_cars, filter_car_list
+
+
+# Комбинации фильтров, которые реально приходят из сайдбара и быстрых фильтров на главной
+FILTER_COMBINATIONS = [
+    '',
+    'min_price=500000',
+    'max_price=1000000',
+    'min_price=500000&max_price=1000000',
+    'min_year=2020',
+    'max_mileage=50000',
+    'year_range=2015-2019',
+    'brand=Toyota',
+    'brand=Toyota&model=Camry',
+    'brand=Toyota&max_price=2000000',
+    'country=japan',
+    'transmission=automatic',
+    'engine_type=diesel',
+    'body_type=suv',
+    'features={feature_id}',
+]
+
+
+class Command(BaseCommand):
+    help = 'Выводит EXPLAIN QUERY PLAN для каждой комбинации фильтров и сортировки каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать план каждого запроса целиком')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда поддерживает только SQLite (EXPLAIN QUERY PLAN)')
+
+        feature_id = Feature.objects.values_list('id', flat=True).first()
+        scans = []
+        checked = 0
+        for filters in FILTER_COMBINATIONS:
+            if '{feature_id}' in filters:
+                if feature_id is None:
+                    self.stdout.write(self.style.WARNING(f'SKIP   {filters}: в базе нет ни одной опции'))
+                    continue
+                filters = filters.format(feature_id=feature_id)
+
+            for sort, _label in CarFilterForm.SORT_CHOICES:
+                params = QueryDict(filters, mutable=True)
+                params['sort'] = sort
+                form = CarFilterForm(params)
+                # Марка и модель валидируются по наличию в базе - для плана запроса данные не нужны
+                form.fields['brand'].choices = [('', ''), (params.get('brand', ''), '')]
+                form.fields['model'].choices = [('', ''), (params.get('model', ''), '')]
+
+                plan = self.explain(filter_car_list(published_cars(), params, form)[:12])
+                checked += 1
+
+                full_scan = [row for row in plan if row.startswith('SCAN ') and 'USING' not in row]
+                label = f'{filters or "-"} sort={sort}'
+                if full_scan:
+                    scans.append(label)
+                    self.stdout.write(self.style.ERROR(f'SCAN   {label}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'INDEX  {label}'))
+                if options['verbose_plans'] or full_scan:
+                    for row in plan:
+                        self.stdout.write(f'         {row}')
+
+        if scans:
+            raise CommandError(f'Полный просмотр таблицы в {len(scans)} из {checked} запросов')
+        self.stdout.write(self.style.SUCCESS(f'Все {checked} запросов используют индексы'))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
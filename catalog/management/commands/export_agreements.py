@@ -0,0 +1,51 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalog.agreement_archive import agreements_zip, default_workers
+from catalog.models import PurchaseAgreementRequest
+
+
+def month_bounds(value):
+    try:
+        start = datetime.datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        return None
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+class Command(BaseCommand):
+    help = 'Рендерит PDF договоров на всех ядрах и складывает их в ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к ZIP-архиву')
+        parser.add_argument('--month', help='Договоры за месяц, например 2025-03')
+        parser.add_argument('--ids', nargs='+', type=int, help='Только договоры с этими id')
+        parser.add_argument('--workers', type=int, default=default_workers(), help='Число процессов')
+
+    def handle(self, *args, **options):
+        agreements = PurchaseAgreementRequest.objects.select_related('car').order_by('created_at', 'id')
+        if options['month']:
+            bounds = month_bounds(options['month'])
+            if bounds is None:
+                raise CommandError(f"Месяц указывается как ГГГГ-ММ: {options['month']}")
+            agreements = agreements.filter(created_at__gte=bounds[0], created_at__lt=bounds[1])
+        if options['ids']:
+            agreements = agreements.filter(pk__in=options['ids'])
+
+        count = agreements.count()
+        if not count:
+            self.stdout.write(self.style.WARNING('Договоров не найдено'))
+            return
+
+        started = time.perf_counter()
+        with open(options['output'], 'wb') as output:
+            for chunk in agreements_zip(agreements.iterator(chunk_size=200), options['workers']):
+                output.write(chunk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} договоров в {options["output"]} за {elapsed:.1f} с ({options["workers"]} процессов)'
+        ))
@@ -0,0 +1,30 @@
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import EXPORT_FORMATS, export_lines, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка инвентаря в CSV, JSON Lines или YML для площадок объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='yml')
+        parser.add_argument('--output', help='Файл для записи (по умолчанию stdout)')
+        parser.add_argument('--base-url', required=True, help='Адрес сайта для ссылок на объявления и фото')
+        parser.add_argument('--since', help='Только автомобили, измененные после даты (ISO 8601)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_since(options['since'])
+            if since is None:
+                raise CommandError(f"Не удалось разобрать дату: {options['since']}")
+
+        lines = export_lines(options['format'], options['base_url'], since=since)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            self.stdout.ending = ''
+            for line in lines:
+                self.stdout.write(line)
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from catalog.renditions import RENDITION_FORMATS, RENDITION_SIZES
+from catalog.storage import INCOMING_DIR, photo_file_references, walk_files
+
+PHOTO_DIR = 'car_photos'
+RENDITION_EXTS = {ext for ext, _options in RENDITION_FORMATS.values()}
+
+
+def original_root(name):
+    """Для копии abc.card.webp - abc, для оригинала - None"""
+    root, ext = os.path.splitext(name)
+    root, size = os.path.splitext(root)
+    if ext.lstrip('.') in RENDITION_EXTS and size.lstrip('.') in RENDITION_SIZES:
+        return root
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы фотографий и превью, на которые не ссылается ни один CarPhoto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Не трогать файлы моложе: их запись в базу могла еще не завершиться')
+
+    def handle(self, *args, **options):
+        references = photo_file_references()
+        reference_roots = {os.path.splitext(name)[0] for name in references}
+        cutoff = time.time() - options['grace_minutes'] * 60
+
+        orphans = []
+        for name, mtime in walk_files(PHOTO_DIR):
+            if mtime > cutoff:
+                continue
+            if f'/{INCOMING_DIR}/' in f'/{name}':
+                orphans.append(name)  # брошенная недописанная загрузка
+                continue
+            root = original_root(name)
+            if root is not None:
+                if root not in reference_roots:
+                    orphans.append(name)
+            elif name not in references:
+                orphans.append(name)
+
+        freed = 0
+        for name in orphans:
+            freed += os.path.getsize(os.path.join(settings.MEDIA_ROOT, name))
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {len(orphans)}, {freed / 1024 / 1024:.1f} МБ'))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import IMPORT_BATCH_SIZE, ImportFailed, import_cars, read_rows
+
+# Сколько ошибок показывать, чтобы не утопить вывод при неверном файле
+MAX_REPORTED_ERRORS = 50
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт автомобилей из CSV или JSON Lines с проверкой всех строк до записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv или .jsonl')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='По умолчанию - по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить строки')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                rows = list(read_rows(file, import_format))
+            created, updated = import_cars(rows, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+        except ValueError as error:
+            # json.JSONDecodeError - тоже ValueError
+            raise CommandError(f'Не удалось разобрать файл: {error}')
+        except ImportFailed as error:
+            for message in error.errors[:MAX_REPORTED_ERRORS]:
+                self.stderr.write(message)
+            if len(error.errors) > MAX_REPORTED_ERRORS:
+                self.stderr.write(f'... и еще {len(error.errors) - MAX_REPORTED_ERRORS}')
+            raise CommandError(f'{error}. Ничего не импортировано')
+        elapsed = time.perf_counter() - started
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Строки корректны: {len(rows)}'))
+            return
+        rate = len(rows) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {created}, обновлено: {updated} за {elapsed:.2f} с ({rate:.0f} строк/с)'
+        ))
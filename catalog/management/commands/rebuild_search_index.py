@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import search
+from catalog.models import Car
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс каталога (FTS5) по всем автомобилям'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Полнотекстовый индекс поддерживается только на SQLite')
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано автомобилей: {Car.objects.count()}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog.brands import refresh_car_countries, reset_brand_countries
+from catalog.models import Car
+
+
+class Command(BaseCommand):
+    help = 'Перевыводит страну всех автомобилей из справочника марок: один UPDATE на страну'
+
+    def handle(self, *args, **options):
+        reset_brand_countries()
+        changed = refresh_car_countries()
+        if not changed:
+            self.stdout.write(self.style.SUCCESS('Страны всех автомобилей уже соответствуют справочнику'))
+            return
+        labels = dict(Car.COUNTRY_CHOICES)
+        for country, count in changed.items():
+            self.stdout.write(f'{labels[country]}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Обновлено автомобилей: {sum(changed.values())}'))
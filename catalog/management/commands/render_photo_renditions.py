@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from catalog.models import CarPhoto
+from catalog.renditions import render_renditions
+
+
+def render_one(photo_id, image_name):
+    """Выполняется в процессе пула: только файлы, без обращений к базе"""
+    try:
+        render_renditions(image_name)
+    except Exception as error:
+        return photo_id, str(error)
+    return photo_id, None
+
+
+class Command(BaseCommand):
+    help = 'Готовит превью JPEG/WebP для уже загруженных фотографий на всех ядрах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+        parser.add_argument('--force', action='store_true', help='Перерендерить и уже готовые превью')
+        parser.add_argument('--batch-size', type=int, default=200, help='Как часто отмечать готовые фото в базе')
+
+    def handle(self, *args, **options):
+        photos = CarPhoto.objects.exclude(image='')
+        if not options['force']:
+            photos = photos.filter(has_renditions=False)
+        pending = list(photos.values_list('id', 'image'))
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('Все превью уже готовы'))
+            return
+
+        started = time.perf_counter()
+        done, failed = [], 0
+        # initializer нужен для платформ, где процессы пула запускаются через spawn
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = [pool.submit(render_one, photo_id, name) for photo_id, name in pending]
+            for future in as_completed(futures):
+                photo_id, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Фото {photo_id}: {error}')
+                    continue
+                done.append(photo_id)
+                if len(done) >= options['batch_size']:
+                    CarPhoto.objects.filter(pk__in=done).update(has_renditions=True)
+                    done = []
+        CarPhoto.objects.filter(pk__in=done).update(has_renditions=True)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(pending) - failed} из {len(pending)} за {elapsed:.1f} с ({options["workers"]} процессов)'
+        ))
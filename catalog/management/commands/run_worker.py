@@ -0,0 +1,64 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from catalog.tasks import REGISTRY, claim, run_task
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: рендер превью фотографий, PDF договоров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Число потоков-исполнителей')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза, когда очередь пуста (с)')
+        parser.add_argument('--burst', action='store_true', help='Выйти, когда очередь опустеет')
+        parser.add_argument('--only', nargs='*', help='Брать только задачи с этими именами')
+
+    def handle(self, *args, **options):
+        names = options['only'] or None
+        unknown = set(names or ()) - set(REGISTRY)
+        if unknown:
+            self.stderr.write(f"Неизвестные задачи: {', '.join(sorted(unknown))}")
+        stop = threading.Event()
+        processed = []
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+        def work(number):
+            worker_id = f'{prefix}:{number}'
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    task_row = claim(worker_id, names)
+                    if task_row is None:
+                        if options['burst']:
+                            return
+                        stop.wait(options['poll_interval'])
+                        continue
+                    ok = run_task(task_row)
+                    processed.append(ok)
+                    status = 'ok' if ok else 'ошибка'
+                    self.stdout.write(f'[{worker_id}] {task_row.name} #{task_row.pk}: {status}')
+            finally:
+                # У каждого потока свое соединение с базой
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(number,), daemon=True)
+                   for number in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка: дожидаемся текущих задач...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {processed.count(True)}, с ошибкой: {processed.count(False)}'
+        ))
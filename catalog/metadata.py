@@ -0,0 +1,60 @@
+"""Сводка по опубликованному инвентарю: марки -> модели -> количество и диапазоны цен, лет, пробега"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Max
+
+from .cache import versioned_key
+from .queries import published_cars
+
+METADATA_TIMEOUT = 60 * 60 * 24
+RANGE_FIELDS = ('price', 'year', 'mileage')
+
+
+def build_metadata():
+    """Один GROUP BY brand, model; марки и общие диапазоны собираются в Python"""
+    aggregates = {}
+    for field in RANGE_FIELDS:
+        aggregates[f'min_{field}'] = Min(field)
+        aggregates[f'max_{field}'] = Max(field)
+    rows = published_cars().order_by('brand', 'model') \
+                           .values('brand', 'model') \
+                           .annotate(total=Count('id'), **aggregates)
+
+    brands = {}
+    ranges = {field: {'min': None, 'max': None} for field in RANGE_FIELDS}
+    for row in rows:
+        brand = brands.setdefault(row['brand'], {'name': row['brand'], 'count': 0, 'models': []})
+        brand['count'] += row['total']
+        brand['models'].append({'name': row['model'], 'count': row['total']})
+        for field in RANGE_FIELDS:
+            low, high = row[f'min_{field}'], row[f'max_{field}']
+            if ranges[field]['min'] is None or low < ranges[field]['min']:
+                ranges[field]['min'] = low
+            if ranges[field]['max'] is None or high > ranges[field]['max']:
+                ranges[field]['max'] = high
+
+    data = {'brands': list(brands.values()), **ranges}
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return {'data': data, 'etag': hashlib.md5(payload.encode()).hexdigest()}
+
+
+def get_catalog_metadata():
+    key = versioned_key('metadata')
+    metadata = cache.get(key)
+    if metadata is None:
+        metadata = build_metadata()
+        cache.set(key, metadata, METADATA_TIMEOUT)
+    return metadata
+
+
+def brand_names():
+    return [brand['name'] for brand in get_catalog_metadata()['data']['brands']]
+
+
+def model_names(brand_name):
+    for brand in get_catalog_metadata()['data']['brands']:
+        if brand['name'] == brand_name:
+            return [model['name'] for model in brand['models']]
+    return []
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_carphoto_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['-created_at'], name='car_pub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['price'], name='car_pub_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['year'], name='car_pub_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['mileage'], name='car_pub_mileage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['brand', 'model', 'price'], name='car_pub_brand_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['country', 'price'], name='car_pub_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['transmission', 'price'], name='car_pub_transmission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['engine_type', 'price'], name='car_pub_engine_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sold', False)), fields=['body_type', 'price'], name='car_pub_body_idx'),
+        ),
+    ]
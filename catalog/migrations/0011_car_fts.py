@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CREATE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_car_fts
+    USING fts5(brand, model, generation, description, features, tokenize="unicode61 remove_diacritics 2")
+'''
+
+FILL_SQL = '''
+    INSERT INTO catalog_car_fts (rowid, brand, model, generation, description, features)
+    SELECT c.id, c.brand, c.model, c.generation, c.description,
+           COALESCE((SELECT group_concat(f.name, ' ')
+                     FROM catalog_car_features cf JOIN catalog_feature f ON f.id = cf.feature_id
+                     WHERE cf.car_id = c.id), '')
+    FROM catalog_car c
+'''
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(FILL_SQL)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_car_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_car_published_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
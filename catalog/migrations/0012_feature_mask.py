@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+def fill_masks(apps, schema_editor):
+    Feature = apps.get_model('catalog', 'Feature')
+    Car = apps.get_model('catalog', 'Car')
+    bits = {}
+    for bit, feature in enumerate(Feature.objects.order_by('id')[:63]):
+        feature.bit = bit
+        feature.save(update_fields=['bit'])
+        bits[feature.pk] = bit
+
+    masks = {}
+    for car_id, feature_id in Car.features.through.objects.values_list('car_id', 'feature_id'):
+        if feature_id in bits:
+            masks[car_id] = masks.get(car_id, 0) | (1 << bits[feature_id])
+    for car_id, mask in masks.items():
+        Car.objects.filter(pk=car_id).update(feature_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_car_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='feature_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска опций'),
+        ),
+        migrations.AddField(
+            model_name='feature',
+            name='bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True, verbose_name='Бит в маске опций'),
+        ),
+        migrations.RunPython(fill_masks, migrations.RunPython.noop),
+    ]
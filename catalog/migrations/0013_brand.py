@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+# Списки, которые раньше были зашиты в CarAdmin.save_model
+BRANDS = {
+    'japan': ['Toyota', 'Nissan', 'Honda', 'Mazda', 'Subaru', 'Mitsubishi', 'Suzuki'],
+    'germany': ['BMW', 'Mercedes', 'Audi', 'Volkswagen', 'Opel', 'Porsche'],
+    'korea': ['Hyundai', 'Kia', 'Daewoo'],
+    'usa': ['Ford', 'Chevrolet', 'Cadillac', 'Jeep', 'Chrysler'],
+    'france': ['Renault', 'Peugeot', 'Citroen'],
+    'italy': ['Fiat', 'Alfa Romeo', 'Ferrari', 'Lamborghini'],
+    'russia': ['Lada', 'GAZ', 'UAZ'],
+}
+
+
+def fill_brands(apps, schema_editor):
+    Brand = apps.get_model('catalog', 'Brand')
+    Brand.objects.bulk_create([
+        Brand(name=name, country=country) for country, names in BRANDS.items() for name in names
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_feature_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Brand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Марка')),
+                ('country', models.CharField(choices=[('japan', 'Япония'), ('germany', 'Германия'), ('korea', 'Корея'), ('usa', 'США'), ('france', 'Франция'), ('italy', 'Италия'), ('russia', 'Россия'), ('other', 'Другая')], max_length=10, verbose_name='Страна')),
+            ],
+            options={
+                'verbose_name': 'Марка',
+                'verbose_name_plural': 'Марки',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(fill_brands, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_brand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carphoto',
+            name='has_renditions',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Превью готовы'),
+        ),
+    ]
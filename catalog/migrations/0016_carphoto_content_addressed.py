@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:02
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0015_task_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='carphoto',
+            name='image',
+            field=models.ImageField(storage=catalog.storage.ContentAddressedStorage(), upload_to='car_photos/', verbose_name='Фотография'),
+        ),
+    ]
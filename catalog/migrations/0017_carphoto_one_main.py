@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+def fix_main_photos(apps, schema_editor):
+    """Перед ограничением: у каждого автомобиля с фото ровно одна главная - самая ранняя из отмеченных"""
+    CarPhoto = apps.get_model('catalog', 'CarPhoto')
+    main = {}
+    first = {}
+    for photo_id, car_id, is_main in CarPhoto.objects.order_by('id').values_list('id', 'car_id', 'is_main'):
+        first.setdefault(car_id, photo_id)
+        if is_main:
+            main.setdefault(car_id, photo_id)
+    keep = [main.get(car_id, photo_id) for car_id, photo_id in first.items()]
+    CarPhoto.objects.exclude(pk__in=keep).filter(is_main=True).update(is_main=False)
+    CarPhoto.objects.filter(pk__in=keep).update(is_main=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_carphoto_content_addressed'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_main_photos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carphoto',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main', True)), fields=('car',), name='carphoto_one_main'),
+        ),
+    ]
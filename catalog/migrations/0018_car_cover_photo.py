@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_cover_photos(apps, schema_editor):
+    Car = apps.get_model('catalog', 'Car')
+    CarPhoto = apps.get_model('catalog', 'CarPhoto')
+    for car_id, photo_id in CarPhoto.objects.filter(is_main=True).values_list('car_id', 'id'):
+        Car.objects.filter(pk=car_id).update(cover_photo=photo_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_carphoto_one_main'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='cover_photo',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.carphoto', verbose_name='Обложка'),
+        ),
+        migrations.RunPython(fill_cover_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_car_cover_photo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseagreementrequest',
+            name='pdf_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Отпечаток PDF'),
+        ),
+    ]
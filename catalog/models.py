@@ -1,14 +1,36 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-        
+
+from .brands import brand_countries, country_for_brand
+from .feature_mask import next_free_bit, refresh_masks
+from .storage import ContentAddressedStorage
+
+# Условие частичных индексов: в каталоге участвуют только опубликованные и непроданные авто
+PUBLISHED_CONDITION = models.Q(is_published=True, is_sold=False)
+# Поля Car, которые ведутся отдельно от формы автомобиля и не пишутся обычным save()
+DERIVED_CAR_FIELDS = ('cover_photo', 'feature_mask')
+
 class Feature(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название опции")
     category = models.CharField(max_length=50, blank=True, verbose_name="Категория", help_text="Например: Салон, Комфорт, Безопасность")
+    bit = models.PositiveSmallIntegerField(null=True, blank=True, unique=True, editable=False, verbose_name="Бит в маске опций")
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        gained_bit = False
+        if self.bit is None:
+            self.bit = next_free_bit(Feature)
+            # Опция без бита (их было больше 63) получила освободившийся: у ее автомобилей бит еще не взведен
+            gained_bit = self.bit is not None and self.pk is not None
+            if gained_bit and kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'bit'}
+        super().save(*args, **kwargs)
+        if gained_bit:
+            refresh_masks(self.car_set.values_list('id', flat=True))
+
     class Meta:
         verbose_name = "Опция"
         verbose_name_plural = "Опции"
@@ -24,6 +46,31 @@ class Characteristic(models.Model):
         verbose_name = "Характеристика"
         verbose_name_plural = "Характеристики"
 
+class CarQuerySet(models.QuerySet):
+    """bulk_create и bulk_update не вызывают save(), поэтому страну по марке проставляем здесь"""
+
+    def touch(self, **fields):
+        """update() с отметкой updated_at: auto_now срабатывает только в save(), а по этому полю
+        инкрементальная выгрузка находит изменения фотографий и опций"""
+        return self.update(updated_at=timezone.now(), **fields)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        countries = brand_countries()
+        for car in objs:
+            car.country = countries.get(car.brand, 'other')
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'brand' in fields:
+            objs = list(objs)
+            countries = brand_countries()
+            for car in objs:
+                car.country = countries.get(car.brand, 'other')
+            fields = list(dict.fromkeys([*fields, 'country']))
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Car(models.Model):
     brand = models.CharField(max_length=50, verbose_name="Марка")
     model = models.CharField(max_length=50, verbose_name="Модель")
@@ -93,25 +140,83 @@ class Car(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     is_sold = models.BooleanField(default=False, verbose_name="Продано")
     is_published = models.BooleanField(default=True, verbose_name="Опубликовано")
+    feature_mask = models.BigIntegerField(default=0, editable=False, verbose_name="Маска опций")
+    # Копия главной фотографии (CarPhoto.is_main) для карточек без отдельного запроса за фото
+    cover_photo = models.ForeignKey('CarPhoto', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+                                    editable=False, verbose_name="Обложка")
+
+    objects = CarQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.year}), {self.price} руб."
 
+    def save(self, *args, **kwargs):
+        # Страна всегда выводится из марки: админка, list_editable, shell и импорт идут через один справочник
+        self.country = country_for_brand(self.brand)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'brand' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'country'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Обложку ведут фотографии, маску опций - m2m_changed, оба пишут через update(); загруженный
+            # раньше экземпляр не должен затирать их старыми значениями
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in DERIVED_CAR_FIELDS]
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Автомобиль"
         verbose_name_plural = "Автомобили"
-    
+        indexes = [
+            models.Index(fields=['-created_at'], condition=PUBLISHED_CONDITION, name='car_pub_created_idx'),
+            models.Index(fields=['price'], condition=PUBLISHED_CONDITION, name='car_pub_price_idx'),
+            models.Index(fields=['year'], condition=PUBLISHED_CONDITION, name='car_pub_year_idx'),
+            models.Index(fields=['mileage'], condition=PUBLISHED_CONDITION, name='car_pub_mileage_idx'),
+            models.Index(fields=['brand', 'model', 'price'], condition=PUBLISHED_CONDITION, name='car_pub_brand_model_idx'),
+            models.Index(fields=['country', 'price'], condition=PUBLISHED_CONDITION, name='car_pub_country_idx'),
+            models.Index(fields=['transmission', 'price'], condition=PUBLISHED_CONDITION, name='car_pub_transmission_idx'),
+            models.Index(fields=['engine_type', 'price'], condition=PUBLISHED_CONDITION, name='car_pub_engine_idx'),
+            models.Index(fields=['body_type', 'price'], condition=PUBLISHED_CONDITION, name='car_pub_body_idx'),
+        ]
+
+class Brand(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name="Марка")
+    country = models.CharField(max_length=10, choices=Car.COUNTRY_CHOICES, verbose_name="Страна")
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Марка"
+        verbose_name_plural = "Марки"
+
 class CarPhoto(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='photos', verbose_name="Автомобиль")
-    image = models.ImageField(upload_to='car_photos/', verbose_name="Фотография")
+    image = models.ImageField(upload_to='car_photos/', storage=ContentAddressedStorage(), verbose_name="Фотография")
     is_main = models.BooleanField(default=False, verbose_name="Главная фотография")
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True, verbose_name="Дата добавления")
+    has_renditions = models.BooleanField(default=False, editable=False, verbose_name="Превью готовы")
     def __str__(self):
         return f"Фото {self.car.brand} {self.car.model}"
 
+    def save(self, *args, **kwargs):
+        # Новая главная фотография снимает отметку с прежней до записи, иначе сработает ограничение
+        if self.is_main:
+            CarPhoto.objects.filter(car_id=self.car_id, is_main=True).exclude(pk=self.pk).update(is_main=False)
+        super().save(*args, **kwargs)
+        cars = Car.objects.filter(pk=self.car_id)
+        if self.is_main:
+            cars.touch(cover_photo=self.pk)
+        else:
+            cars.filter(cover_photo=self.pk).update(cover_photo=None)
+            cars.touch()
+
     class Meta:
         verbose_name = "Фотография автомобиля"
         verbose_name_plural = "Фотографии автомобилей"
+        constraints = [
+            models.UniqueConstraint(fields=['car'], condition=models.Q(is_main=True), name='carphoto_one_main'),
+        ]
 
 class PurchaseAgreementRequest(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, verbose_name="Автомобиль")
@@ -138,6 +243,9 @@ class PurchaseAgreementRequest(models.Model):
     car_price = models.PositiveIntegerField(verbose_name="Цена автомобиля")
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    pdf = models.FileField(upload_to='agreements/', blank=True, editable=False, verbose_name="PDF договора")
+    # Отпечаток данных и бланка, под которым отрендерен pdf (agreement_store)
+    pdf_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True, verbose_name="Отпечаток PDF")
 
     def __str__(self):
         return f"Договор для {self.buyer_full_name} - {self.car_brand} {self.car_model}"
@@ -188,4 +296,36 @@ class InspectionRequest(models.Model):
             inspection_date=self.inspection_date,
             inspection_time=self.inspection_time,
             status__in=['pending', 'confirmed']
-        ).exclude(id=self.id).exists()
\ No newline at end of file
+        ).exclude(id=self.id).exists()
+
+
+class Task(models.Model):
+    """Фоновая задача для run_worker: очередь прямо в базе, без брокера"""
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Аргументы")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запустить не раньше")
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="Занята до")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата завершения")
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_idx'),
+        ]
@@ -0,0 +1,112 @@
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+CURSOR_SALT = 'catalog.cursor'
+
+
+class KeysetPage:
+    """Страница курсорной пагинации: без COUNT(*) и без OFFSET"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def encode_cursor(sort, obj, direction):
+    field = sort.lstrip('-')
+    # Строки страницы - экземпляры модели или словари из .values()
+    if isinstance(obj, dict):
+        value, pk = obj[field], obj['id']
+    else:
+        value, pk = getattr(obj, field), obj.pk
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return signing.dumps({'s': sort, 'v': value, 'id': pk, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, sort, model):
+    """Возвращает (значение, id, направление) или None, если курсор битый или от другой сортировки"""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get('s') != sort or data.get('d') not in ('next', 'prev'):
+        return None
+    try:
+        field = model._meta.get_field(sort.lstrip('-'))
+    except FieldDoesNotExist:
+        # Сортировка по аннотации (например, search_rank) - значение уже JSON-совместимо
+        return data['v'], data['id'], data['d']
+    return field.to_python(data['v']), data['id'], data['d']
+
+
+def keyset_paginate(queryset, cursor=None, per_page=12):
+    """Курсорная пагинация по первой сортировке queryset с id в качестве тай-брейкера"""
+    sort = queryset.query.order_by[0] if queryset.query.order_by else '-created_at'
+    field = sort.lstrip('-')
+    descending = sort.startswith('-')
+    id_order = '-id' if descending else 'id'
+
+    position = decode_cursor(cursor, sort, queryset.model)
+    if position is None:
+        direction = 'next'
+        rows = list(queryset.order_by(sort, id_order)[:per_page + 1])
+    else:
+        value, pk, direction = position
+        # Для "назад" идем в обратную сторону и потом разворачиваем страницу
+        forward = (direction == 'next')
+        lookup = 'lt' if descending == forward else 'gt'
+        after = Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+        if forward:
+            ordering = (sort, id_order)
+        else:
+            ordering = (field if descending else f'-{field}', 'id' if descending else '-id')
+        rows = list(queryset.filter(after).order_by(*ordering)[:per_page + 1])
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+
+    return KeysetPage(
+        rows,
+        has_next=has_next,
+        has_previous=has_previous,
+        next_cursor=encode_cursor(sort, rows[-1], 'next') if has_next and rows else None,
+        prev_cursor=encode_cursor(sort, rows[0], 'prev') if has_previous and rows else None,
+    )
+
+
+def querystring(params, **updates):
+    """GET-параметры текущего запроса с заменой отдельных ключей"""
+    query = params.copy()
+    for key, value in updates.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
@@ -0,0 +1,103 @@
+"""
+Пакетная загрузка фотографий автомобиля.
+
+Файлы проверяются параллельно в пуле потоков: размер и заголовок изображения
+читаются без полного декодирования, битые и слишком большие файлы отсекаются до
+записи. Прошедшие проверку сохраняются одним bulk_create в транзакции. У автомобиля
+с фотографиями ровно одна главная (is_main), и она же продублирована в Car.cover_photo:
+это держат CarPhoto.save, ограничение в базе и ensure_main_photo после удаления.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, UnidentifiedImageError
+
+from .cache import bump_inventory_version
+from .models import Car, CarPhoto
+from .tasks import enqueue_many
+
+# Столько же, сколько допускает CarPhotoInline в админке
+MAX_PHOTOS_PER_CAR = 20
+MAX_PHOTO_BYTES = 15 * 1024 * 1024
+MAX_PHOTO_PIXELS = 50_000_000
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+VALIDATION_THREADS = 8
+
+
+def inspect_photo(upload):
+    """Проверяет один файл; сообщение об ошибке или None"""
+    if upload.size > MAX_PHOTO_BYTES:
+        return f'{upload.name}: файл больше {filesizeformat(MAX_PHOTO_BYTES)}'
+    try:
+        upload.seek(0)
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        return f'{upload.name}: файл поврежден или не является изображением'
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        return f'{upload.name}: поддерживаются только JPEG, PNG и WebP'
+    if width * height > MAX_PHOTO_PIXELS:
+        return f'{upload.name}: слишком большое разрешение ({width}x{height})'
+    return None
+
+
+def check_photo_limit(car, count):
+    existing = car.photos.count() if car is not None else 0
+    if existing + count > MAX_PHOTOS_PER_CAR:
+        raise ValidationError(
+            f'У автомобиля может быть не больше {MAX_PHOTOS_PER_CAR} фотографий, '
+            f'уже загружено {existing}, выбрано {count}'
+        )
+
+
+def validate_photos(car, uploads):
+    """Проверяет пачку файлов; ValidationError со всеми ошибками сразу"""
+    check_photo_limit(car, len(uploads))
+    if not uploads:
+        return
+    with ThreadPoolExecutor(max_workers=min(VALIDATION_THREADS, len(uploads))) as pool:
+        errors = [error for error in pool.map(inspect_photo, uploads) if error]
+    if errors:
+        raise ValidationError(errors)
+
+
+def add_photos(car, uploads):
+    """
+    Сохраняет проверенные файлы одним bulk_create; первая станет главной, если главной еще нет.
+    ValidationError, если параллельная загрузка успела занять место под фотографии
+    """
+    if not uploads:
+        return []
+    with transaction.atomic():
+        # Блокировка строки автомобиля: параллельные загрузки считают фото и ищут главную по очереди,
+        # иначе обе назначат главную (IntegrityError) или вместе превысят лимит
+        Car.objects.select_for_update().only('pk').get(pk=car.pk)
+        check_photo_limit(car, len(uploads))
+        has_main = car.photos.filter(is_main=True).exists()
+        photos = [CarPhoto(car=car, image=upload, is_main=(not has_main and index == 0))
+                  for index, upload in enumerate(uploads)]
+        photos = CarPhoto.objects.bulk_create(photos)
+        # bulk_create не вызывает сигналов - обложку, updated_at, превью и версию инвентаря обрабатываем сами
+        Car.objects.filter(pk=car.pk).touch(**({} if has_main else {'cover_photo': photos[0].pk}))
+        enqueue_many('catalog.render_photo', [{'photo_id': photo.pk} for photo in photos])
+        bump_inventory_version()
+    return photos
+
+
+def ensure_main_photo(car_id):
+    """
+    Назначает главной первую фотографию, если у автомобиля есть фото, но ни одно не главное,
+    и выравнивает Car.cover_photo по главной
+    """
+    photos = CarPhoto.objects.filter(car_id=car_id)
+    main = photos.filter(is_main=True).values_list('pk', flat=True).first()
+    if main is None:
+        main = photos.order_by('id').values_list('pk', flat=True).first()
+        if main is not None:
+            CarPhoto.objects.filter(pk=main).update(is_main=True)
+    Car.objects.filter(pk=car_id).exclude(cover_photo=main).update(cover_photo=main)
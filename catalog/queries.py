@@ -0,0 +1,126 @@
+from django.db.models import Prefetch
+
+from .models import Car, Feature, Characteristic
+from .feature_mask import filter_all_features
+from .search import search_cars
+
+
+def published_cars():
+    """Опубликованные и непроданные автомобили"""
+    return Car.objects.filter(is_published=True, is_sold=False)
+
+
+def car_cards():
+    """Queryset для карточек в каталоге и на главной: обложка приходит JOIN-ом, без запросов за фото"""
+    return published_cars().select_related('cover_photo')
+
+
+def car_detail_queryset():
+    """Queryset для страницы автомобиля: обложка, опции по категориям и характеристики; галерея - через API"""
+    return Car.objects.filter(is_published=True).select_related('cover_photo').prefetch_related(
+        Prefetch('features', queryset=Feature.objects.order_by('category', 'name')),
+        Prefetch('characteristics', queryset=Characteristic.objects.order_by('name')),
+    )
+
+
+def cars_in_order(cars, ids):
+    """Автомобили по списку id в том же порядке, одним запросом"""
+    by_id = {car.pk: car for car in cars.filter(id__in=ids)}
+    return [by_id[car_id] for car_id in ids if car_id in by_id]
+
+
+def default_sort_for(q):
+    """Для поиска по умолчанию сортируем по релевантности"""
+    return 'search_rank' if q else '-created_at'
+
+
+def car_list_criteria(data, filter_form):
+    """Условия каталога по GET-параметрам и CarFilterForm: список (lookup, значение) и сортировка"""
+    criteria = []
+    brand = data.get('brand')
+    transmission = data.get('transmission')
+    body_type = data.get('body_type')
+    brands = data.getlist('brand')
+    q = data.get('q', '').strip()
+
+    if q:
+        criteria.append(('search', q))
+
+    if brands:
+        criteria.append(('brand__in', brands))
+
+    if brand:
+        criteria.append(('brand', brand))
+    if transmission:
+        criteria.append(('transmission', transmission))
+    if body_type:
+        criteria.append(('body_type', body_type))
+
+    default_sort = default_sort_for(q)
+    if not filter_form.is_valid():
+        return criteria, default_sort
+
+    brand_form = filter_form.cleaned_data.get('brand')
+    model = filter_form.cleaned_data.get('model')
+    min_price_form = filter_form.cleaned_data.get('min_price')
+    max_price_form = filter_form.cleaned_data.get('max_price')
+    min_year = filter_form.cleaned_data.get('min_year')
+    max_mileage = filter_form.cleaned_data.get('max_mileage')
+    year_range = filter_form.cleaned_data.get('year_range')
+    transmission_form = filter_form.cleaned_data.get('transmission')
+    engine_type = filter_form.cleaned_data.get('engine_type')
+    features = filter_form.cleaned_data.get('features')
+    sort = filter_form.cleaned_data.get('sort') or default_sort
+    country = data.get('country')
+
+    if brand_form and not brand:
+        criteria.append(('brand', brand_form))
+
+    if country:
+        criteria.append(('country', country))
+
+    if model:
+        criteria.append(('model', model))
+
+    if min_price_form:
+        criteria.append(('price__gte', min_price_form))
+    if max_price_form:
+        criteria.append(('price__lte', max_price_form))
+    if min_year:
+        criteria.append(('year__gte', min_year))
+    if max_mileage:
+        criteria.append(('mileage__lte', max_mileage))
+
+    if year_range:
+        if year_range == '2020-':
+            criteria.append(('year__gte', 2020))
+        elif year_range == '2015-2019':
+            criteria.append(('year__range', (2015, 2019)))
+        elif year_range == '2010-2014':
+            criteria.append(('year__range', (2010, 2014)))
+        elif year_range == '-2009':
+            criteria.append(('year__lte', 2009))
+
+    if transmission_form and not transmission:
+        criteria.append(('transmission', transmission_form))
+
+    if engine_type:
+        criteria.append(('engine_type', engine_type))
+
+    if features:
+        criteria.append(('features__all', [feature.pk for feature in features]))
+
+    return criteria, sort
+
+
+def filter_car_list(cars, data, filter_form):
+    """Фильтры и сортировка каталога по GET-параметрам и CarFilterForm"""
+    criteria, sort = car_list_criteria(data, filter_form)
+    for lookup, value in criteria:
+        if lookup == 'search':
+            cars = search_cars(cars, value)
+        elif lookup == 'features__all':
+            cars = filter_all_features(cars, value)
+        else:
+            cars = cars.filter(**{lookup: value})
+    return cars.order_by(sort)
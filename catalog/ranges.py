@@ -0,0 +1,72 @@
+"""
+Отдача файлов с поддержкой Range (RFC 9110): докачка оборванной загрузки и просмотр
+PDF в браузере по частям. Поддерживается один диапазон; на несколько сразу отвечаем
+всем файлом, как разрешает стандарт.
+"""
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """(начало, конец включительно), None - диапазона нет или он не разобран, False - вне файла"""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 - последние 500 байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(file, start, end):
+    file.seek(start)
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def ranged_file_response(request, file, size, etag, filename, content_type='application/octet-stream'):
+    """Ответ 200/206/416 для открытого файла; ETag нужен, чтобы If-Range не склеил разные версии"""
+    byte_range = None
+    if request.method == 'GET' and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = StreamingHttpResponse(read_range(file, 0, size - 1), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(read_range(file, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
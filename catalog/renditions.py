@@ -0,0 +1,99 @@
+"""
+Уменьшенные копии фотографий автомобилей (renditions) в JPEG и WebP.
+
+Для каждой загруженной фотографии заранее рендерятся размеры card (карточки каталога),
+gallery (карусель на странице автомобиля) и full (просмотр крупно) и кладутся рядом
+с оригиналом: car_photos/abc.jpg -> car_photos/abc.card.jpg, car_photos/abc.card.webp.
+Пока копии не готовы (CarPhoto.has_renditions), шаблоны показывают оригинал.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Вписываем в рамку без увеличения, пропорции сохраняются
+RENDITION_SIZES = {
+    'card': (400, 300),
+    'gallery': (800, 600),
+    'full': (1600, 1200),
+}
+RENDITION_FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+
+def rendition_name(image_name, size, image_format):
+    root, _ext = os.path.splitext(image_name)
+    return f'{root}.{size}.{RENDITION_FORMATS[image_format][0]}'
+
+
+def srcset(image_name, sizes, image_format, storage=default_storage):
+    return ', '.join(
+        f'{storage.url(rendition_name(image_name, size, image_format))} {RENDITION_SIZES[size][0]}w'
+        for size in sizes
+    )
+
+
+def rendition_names(image_name):
+    return [rendition_name(image_name, size, image_format)
+            for size in RENDITION_SIZES for image_format in RENDITION_FORMATS]
+
+
+def render_renditions(image_name, storage=default_storage):
+    """
+    Рендерит все размеры и форматы для файла из хранилища. Не трогает базу, поэтому
+    годится для процессов пула в команде render_photo_renditions.
+    """
+    with storage.open(image_name, 'rb') as original:
+        image = Image.open(original)
+        # Фото с телефонов повернуты через EXIF - применяем поворот до масштабирования
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    for size, box in RENDITION_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        for image_format, (_ext, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format.upper(), **options)
+            name = rendition_name(image_name, size, image_format)
+            # Хранилище не перезаписывает файлы, а добавляет суффикс - удаляем старую копию сами
+            storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(image_name, storage=default_storage):
+    for name in rendition_names(image_name):
+        storage.delete(name)
+
+
+def render_photo(photo):
+    """Рендерит копии для CarPhoto и отмечает has_renditions; True при успехе"""
+    from .models import CarPhoto
+
+    try:
+        render_renditions(photo.image.name)
+    except FileNotFoundError:
+        logger.debug('Файл %s отсутствует, превью не созданы', photo.image.name)
+        return False
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        logger.warning('Не удалось подготовить превью для %s: %s', photo.image.name, error)
+        return False
+    # update(), чтобы не вызывать сигналы сохранения фотографии повторно
+    CarPhoto.objects.filter(pk=photo.pk).update(has_renditions=True)
+    photo.has_renditions = True
+    return True
+
+
+def photo_urls(photo, storage=default_storage):
+    """Оригинал и srcset по всем размерам для JSON-галереи; пока копий нет - только оригинал"""
+    data = {'id': photo.pk, 'is_main': photo.is_main, 'original': storage.url(photo.image.name)}
+    if photo.has_renditions:
+        for image_format in RENDITION_FORMATS:
+            data[image_format] = srcset(photo.image.name, RENDITION_SIZES, image_format, storage)
+    return data
@@ -0,0 +1,87 @@
+"""
+Полнотекстовый поиск по каталогу на SQLite FTS5.
+
+Таблица catalog_car_fts (создается миграцией 0011) хранит марку, модель, поколение,
+описание и названия опций; rowid совпадает с id автомобиля. Синхронизация идет
+через сигналы в catalog/signals.py, полная перестройка - командой rebuild_search_index.
+На других СУБД поиск откатывается к icontains.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'catalog_car_fts'
+# Вес столбцов для bm25: марка и модель важнее описания
+BM25_WEIGHTS = '10.0, 10.0, 5.0, 1.0, 3.0'
+
+INDEX_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, brand, model, generation, description, features)
+    SELECT c.id, c.brand, c.model, c.generation, c.description,
+           COALESCE((SELECT group_concat(f.name, ' ')
+                     FROM catalog_car_features cf JOIN catalog_feature f ON f.id = cf.feature_id
+                     WHERE cf.car_id = c.id), '')
+    FROM catalog_car c
+'''
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение MATCH: все слова обязательны, по префиксу"""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_cars(cars, query):
+    """Фильтрует queryset по запросу и добавляет search_rank (bm25, меньше - лучше)"""
+    expression = match_expression(query)
+    if not expression:
+        return cars
+    if not is_supported():
+        fields = ('brand', 'model', 'generation', 'description', 'features__name')
+        words = re.findall(r'\w+', query)
+        for word in words:
+            cars = cars.filter(reduce(or_, (Q(**{f'{field}__icontains': word}) for field in fields)))
+        return cars.distinct().annotate(search_rank=RawSQL('0', []))
+
+    table = cars.model._meta.db_table
+    return cars.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+    ).annotate(search_rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}, {BM25_WEIGHTS}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        [expression],
+    ))
+
+
+def index_cars(car_ids):
+    if not is_supported():
+        return
+    car_ids = list(car_ids)
+    if not car_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(car_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', car_ids)
+        cursor.execute(f'{INDEX_SQL} WHERE c.id IN ({placeholders})', car_ids)
+
+
+def remove_car(car_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [car_id])
+
+
+def rebuild():
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(INDEX_SQL)
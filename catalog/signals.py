@@ -0,0 +1,142 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import search
+from .brands import refresh_car_countries, reset_brand_countries
+from .cache import bump_cars_version, bump_inventory_version, bump_inspections_version
+from .feature_mask import refresh_masks, clear_bit
+from .inventory_index import inventory_index, is_enabled as inventory_index_enabled
+from .models import Brand, Car, CarPhoto, Feature, Characteristic, InspectionRequest
+from .photos import ensure_main_photo
+from .storage import release_photo_file
+from .tasks import enqueue
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def car_changed(sender, instance, **kwargs):
+    bump_cars_version()
+    if inventory_index_enabled():
+        inventory_index.apply_change([instance.pk])
+
+
+@receiver(post_save, sender=CarPhoto)
+@receiver(post_delete, sender=CarPhoto)
+@receiver(post_save, sender=Feature)
+@receiver(post_save, sender=Characteristic)
+@receiver(post_delete, sender=Characteristic)
+def catalog_content_changed(sender, **kwargs):
+    bump_inventory_version()
+
+
+@receiver(m2m_changed, sender=Car.characteristics.through)
+def car_characteristics_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_inventory_version()
+
+
+@receiver(post_save, sender=Car)
+def car_search_saved(sender, instance, **kwargs):
+    search.index_cars([instance.pk])
+
+
+@receiver(post_delete, sender=Car)
+def car_search_deleted(sender, instance, **kwargs):
+    search.remove_car(instance.pk)
+
+
+@receiver(m2m_changed, sender=Car.features.through)
+def car_features_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После clear с обратной стороны (feature.car_set) уже не узнать, каких автомобилей он коснулся
+        instance._cleared_car_ids = list(instance.car_set.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        car_ids = [instance.pk]
+    elif action == 'post_clear':
+        car_ids = getattr(instance, '_cleared_car_ids', [])
+    else:
+        car_ids = list(pk_set)
+
+    refresh_masks(car_ids)
+    bump_cars_version()
+    if inventory_index_enabled():
+        inventory_index.apply_change(car_ids)
+    search.index_cars(car_ids)
+
+
+@receiver(post_save, sender=Feature)
+def feature_search_saved(sender, instance, created, **kwargs):
+    if not created:
+        search.index_cars(instance.car_set.values_list('id', flat=True))
+        # Название опции попадает в выгрузку - автомобили с ней должны войти в инкрементальную
+        instance.car_set.all().touch()
+
+
+@receiver(pre_delete, sender=Feature)
+def feature_deleting(sender, instance, **kwargs):
+    instance._search_car_ids = list(instance.car_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Feature)
+def feature_deleted(sender, instance, **kwargs):
+    if instance.bit is not None:
+        clear_bit(instance.bit)
+    bump_cars_version()
+    search.index_cars(getattr(instance, '_search_car_ids', []))
+
+
+@receiver(post_save, sender=InspectionRequest)
+@receiver(post_delete, sender=InspectionRequest)
+def inspection_changed(sender, **kwargs):
+    bump_inspections_version()
+
+
+@receiver(pre_save, sender=Brand)
+def brand_changing(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._old_name = Brand.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def brand_changed(sender, instance, **kwargs):
+    reset_brand_countries()
+    # После переименования автомобили со старой маркой больше не входят в справочник
+    old_name = getattr(instance, '_old_name', None)
+    refresh_car_countries(brands={instance.name, old_name} - {None})
+
+
+@receiver(pre_save, sender=CarPhoto)
+def photo_image_changing(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old_name = CarPhoto.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+    if old_name and old_name != instance.image.name:
+        instance.has_renditions = False
+        instance._replaced_image_name = old_name
+
+
+@receiver(post_save, sender=CarPhoto)
+def photo_saved(sender, instance, **kwargs):
+    replaced = getattr(instance, '_replaced_image_name', None)
+    if replaced:
+        transaction.on_commit(lambda: release_photo_file(replaced))
+    if not instance.has_renditions and instance.image:
+        # Рендер занимает секунды на фото - запрос только ставит задачу для run_worker
+        enqueue('catalog.render_photo', photo_id=instance.pk)
+
+
+@receiver(post_delete, sender=CarPhoto)
+def photo_deleted(sender, instance, **kwargs):
+    # Срабатывает и при каскадном удалении Car. Файл общий у одинаковых фото - удаляем после коммита,
+    # если на него больше никто не ссылается
+    name = instance.image.name
+    transaction.on_commit(lambda: release_photo_file(name))
+    Car.objects.filter(pk=instance.car_id).touch()
+    if instance.is_main:
+        ensure_main_photo(instance.car_id)
@@ -12,17 +12,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 modelSelect.disabled = false;
                 
                 
-                fetch(`/api/models/?brand=${encodeURIComponent(brand)}`)
-                    .then(response => response.json())
-                    .then(data => {
+                loadCatalogMeta()
+                    .then(meta => {
                         
                         modelSelect.innerHTML = '<option value="">Любая модель</option>';
                         
+                        const brandMeta = meta.brands.find(item => item.name === brand);
+                        const models = brandMeta ? brandMeta.models : [];
                         
-                        data.models.forEach(model => {
+                        models.forEach(model => {
                             const option = document.createElement('option');
-                            option.value = model;
-                            option.textContent = model;
+                            option.value = model.name;
+                            option.textContent = `${model.name} (${model.count})`;
                             modelSelect.appendChild(option);
                         });
                         
@@ -66,4 +67,42 @@ document.addEventListener('DOMContentLoaded', function() {
             minPriceInput.focus();
         }
     }
-});
\ No newline at end of file
+});
+
+// Сводка каталога (марки, модели, диапазоны) загружается один раз за страницу
+// и хранится в sessionStorage; повторная проверка идет по ETag и обычно дает 304.
+const CATALOG_META_KEY = 'catalogMeta';
+let catalogMetaPromise = null;
+
+function loadCatalogMeta() {
+    if (catalogMetaPromise) {
+        return catalogMetaPromise;
+    }
+    
+    let cached = null;
+    try {
+        cached = JSON.parse(sessionStorage.getItem(CATALOG_META_KEY));
+    } catch (error) {
+        cached = null;
+    }
+    
+    const headers = cached && cached.etag ? {'If-None-Match': cached.etag} : {};
+    catalogMetaPromise = fetch('/api/catalog-meta/', {headers: headers})
+        .then(response => {
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            return response.json().then(data => {
+                try {
+                    sessionStorage.setItem(CATALOG_META_KEY, JSON.stringify({
+                        etag: response.headers.get('ETag'),
+                        data: data
+                    }));
+                } catch (error) {
+                    console.error('Error caching catalog meta:', error);
+                }
+                return data;
+            });
+        });
+    return catalogMetaPromise;
+}
@@ -0,0 +1,135 @@
+// Галереи фотографий: страница отдает только обложку, остальные фото подгружаются
+// из /api/cars/<id>/photos/ при первом взаимодействии с карточкой или каруселью.
+(function() {
+    const INTERACTION_EVENTS = ['pointerenter', 'touchstart', 'focusin'];
+
+    function fetchAllPhotos(url) {
+        const photos = [];
+        const loadPage = page => fetch(`${url}?page=${page}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                photos.push(...data.results);
+                return data.has_next ? loadPage(page + 1) : photos;
+            });
+        return loadPage(1);
+    }
+
+    function onFirstInteraction(element, callback) {
+        const handler = () => {
+            INTERACTION_EVENTS.forEach(name => element.removeEventListener(name, handler));
+            callback();
+        };
+        INTERACTION_EVENTS.forEach(name => element.addEventListener(name, handler, { passive: true }));
+    }
+
+    // Та же разметка, что у {% photo_img %}: WebP в <source>, JPEG в srcset самого <img>
+    function showPhoto(picture, photo, sizes) {
+        const img = picture.querySelector('img');
+        picture.querySelectorAll('source').forEach(source => source.remove());
+        if (photo.webp) {
+            const source = document.createElement('source');
+            source.type = 'image/webp';
+            source.srcset = photo.webp;
+            source.sizes = sizes;
+            picture.insertBefore(source, img);
+        }
+        if (photo.jpeg) {
+            img.srcset = photo.jpeg;
+        } else {
+            img.removeAttribute('srcset');
+        }
+        img.src = photo.original;
+    }
+
+    // Пока превью не готовы (или рендер не удался), {% photo_img %} выводит голый <img> без <picture>
+    function ensurePicture(img) {
+        if (img.parentElement.tagName === 'PICTURE') {
+            return img.parentElement;
+        }
+        const picture = document.createElement('picture');
+        img.replaceWith(picture);
+        picture.appendChild(img);
+        return picture;
+    }
+
+    function buildPicture(template, photo) {
+        const picture = template.cloneNode(true);
+        const img = picture.querySelector('img');
+        img.loading = 'lazy';
+        showPhoto(picture, photo, img.sizes || '100vw');
+        return picture;
+    }
+
+    // Карточка в списке: фото меняется вслед за курсором, на тач-экранах - по касанию
+    function initCard(card) {
+        onFirstInteraction(card, () => {
+            fetchAllPhotos(card.dataset.galleryUrl)
+                .then(photos => {
+                    if (photos.length < 2) {
+                        return;
+                    }
+                    const img = card.querySelector('img');
+                    if (!img) {
+                        return;
+                    }
+                    const picture = ensurePicture(img);
+                    const sizes = img.sizes || '100vw';
+                    let current = 0;
+                    const show = index => {
+                        if (index !== current) {
+                            current = index;
+                            showPhoto(picture, photos[index], sizes);
+                        }
+                    };
+                    card.addEventListener('pointermove', event => {
+                        if (event.pointerType !== 'mouse') {
+                            return;
+                        }
+                        const rect = card.getBoundingClientRect();
+                        const share = (event.clientX - rect.left) / rect.width;
+                        show(Math.min(photos.length - 1, Math.max(0, Math.floor(share * photos.length))));
+                    });
+                    card.addEventListener('pointerleave', () => show(0));
+                    card.addEventListener('click', event => {
+                        if (event.pointerType && event.pointerType !== 'mouse') {
+                            event.preventDefault();
+                            show((current + 1) % photos.length);
+                        }
+                    });
+                })
+                .catch(error => console.error('Ошибка загрузки фотографий:', error));
+        });
+    }
+
+    // Карусель на странице автомобиля: обложка уже отрисована, остальные слайды добавляются
+    function initCarousel(carousel) {
+        onFirstInteraction(carousel, () => {
+            const inner = carousel.querySelector('.carousel-inner');
+            const cover = inner.querySelector('.carousel-item');
+            const template = ensurePicture(cover.querySelector('img'));
+            fetchAllPhotos(carousel.dataset.galleryUrl)
+                .then(photos => {
+                    photos
+                        .filter(photo => String(photo.id) !== cover.dataset.photoId)
+                        .forEach(photo => {
+                            const item = document.createElement('div');
+                            item.className = 'carousel-item';
+                            item.dataset.photoId = photo.id;
+                            item.appendChild(buildPicture(template, photo));
+                            inner.appendChild(item);
+                        });
+                })
+                .catch(error => console.error('Ошибка загрузки фотографий:', error));
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('.card-gallery[data-gallery-url]').forEach(initCard);
+        document.querySelectorAll('.carousel[data-gallery-url]').forEach(initCarousel);
+    });
+})();
@@ -0,0 +1,98 @@
+"""
+Контентно-адресуемое хранилище фотографий автомобилей.
+
+Загруженный файл хешируется (sha256) прямо во время записи на диск и кладется по пути
+car_photos/ab/cd/<sha256>.jpg. Одинаковые фотографии хранятся одним файлом, на который
+ссылаются несколько CarPhoto; файл удаляется, только когда ссылок не осталось.
+Уменьшенные копии (renditions.py) лежат рядом под тем же хешем.
+
+Параллельная загрузка того же файла переиспользует его раньше, чем закоммитит свою
+строку CarPhoto, и release_photo_file ее не видит. Поэтому переиспользование освежает
+mtime файла, а файлы моложе CATALOG_PHOTO_RELEASE_GRACE не удаляются сразу: если ссылок
+на них так и не появилось, их уберет gc_photo_files.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+from .renditions import delete_renditions
+
+# Недописанные загрузки: в том же каталоге, чтобы os.replace был атомарным
+INCOMING_DIR = '.incoming'
+
+
+def content_name(directory, digest, ext):
+    return posixpath.join(directory, digest[:2], digest[2:4], f'{digest}{ext}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, base = posixpath.split(name.replace('\\', '/'))
+        ext = os.path.splitext(base)[1].lower()
+
+        incoming = self.path(posixpath.join(directory, INCOMING_DIR))
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as tmp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        final_name = content_name(directory, digest.hexdigest(), ext)
+        final_path = self.path(final_name)
+        try:
+            # Такой файл уже есть - новая фотография просто сошлется на него; свежий mtime
+            # не даст release_photo_file удалить его, пока наша строка не закоммичена
+            os.utime(final_path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp.name, self.file_permissions_mode)
+            os.replace(tmp.name, final_path)
+        else:
+            os.unlink(tmp.name)
+        return final_name
+
+
+def release_photo_file(name):
+    """Удаляет файл фотографии и его копии, если на него больше не ссылается ни один CarPhoto"""
+    from .models import CarPhoto
+
+    if not name or CarPhoto.objects.filter(image=name).exists():
+        return False
+    try:
+        if time.time() - os.path.getmtime(default_storage.path(name)) < settings.CATALOG_PHOTO_RELEASE_GRACE:
+            return False
+    except FileNotFoundError:
+        pass
+    default_storage.delete(name)
+    delete_renditions(name)
+    return True
+
+
+def photo_file_references():
+    """Множество имен файлов, на которые ссылаются фотографии"""
+    from .models import CarPhoto
+
+    return set(CarPhoto.objects.exclude(image='').values_list('image', flat=True).distinct())
+
+
+def walk_files(directory):
+    """Все файлы под каталогом хранилища: (имя в хранилище, mtime)"""
+    root = os.path.join(settings.MEDIA_ROOT, directory)
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            yield name, os.path.getmtime(path)
@@ -0,0 +1,149 @@
+"""
+Легкая очередь фоновых задач поверх таблицы Task.
+
+Задачи регистрируются декоратором @task и ставятся в очередь через enqueue() в той же
+транзакции, что и данные, которые они обрабатывают. Воркеры (команда run_worker)
+забирают задачу условным UPDATE: из нескольких воркеров его выигрывает только один.
+Забранная задача "занята" до locked_until; если воркер упал, по истечении этого
+времени ее заберет другой. Ошибки повторяются с экспоненциальной задержкой до
+max_attempts попыток. Для тяжелых задач задается concurrency - сколько их может
+выполняться одновременно на всех воркерах: всплеск таких задач не займет все
+процессоры и не задержит остальные задачи в очереди.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Task
+
+REGISTRY = {}
+RETRY_BASE_DELAY = 10
+# Сколько кандидатов проверять за один заход: остальных могли уже забрать другие воркеры
+CLAIM_CANDIDATES = 10
+
+
+class TaskSpec:
+    def __init__(self, name, func, max_attempts, timeout, concurrency=None):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+
+def task(name, max_attempts=3, timeout=300, concurrency=None):
+    """
+    Регистрирует функцию как фоновую задачу; timeout - время видимости в секундах,
+    concurrency - предел одновременно выполняемых задач с этим именем (None - без предела)
+    """
+    def decorator(func):
+        REGISTRY[name] = TaskSpec(name, func, max_attempts, timeout, concurrency)
+        func.enqueue = lambda **payload: enqueue(name, **payload)
+        return func
+    return decorator
+
+
+def enqueue(name, run_at=None, **payload):
+    spec = REGISTRY[name]
+    return Task.objects.create(
+        name=name, payload=payload, max_attempts=spec.max_attempts, run_at=run_at or timezone.now(),
+    )
+
+
+def enqueue_many(name, payloads):
+    """Ставит пачку однотипных задач одним INSERT"""
+    spec = REGISTRY[name]
+    now = timezone.now()
+    return Task.objects.bulk_create([
+        Task(name=name, payload=payload, max_attempts=spec.max_attempts, run_at=now) for payload in payloads
+    ])
+
+
+def ready_condition(now):
+    # Задача в очереди, время которой пришло, или занятая воркером, который не уложился в таймаут
+    return Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def running(now):
+    # Просроченные не считаются: их аренда кончилась, и их заберут заново
+    return Task.objects.filter(status='running', locked_until__gte=now)
+
+
+def saturated_names(now):
+    """Задачи, которые уже выполняются в пределе своей concurrency"""
+    limits = {name: spec.concurrency for name, spec in REGISTRY.items() if spec.concurrency}
+    if not limits:
+        return []
+    counts = dict(running(now).filter(name__in=limits).values_list('name').annotate(Count('id')))
+    return [name for name, limit in limits.items() if counts.get(name, 0) >= limit]
+
+
+def claim(worker_id, names=None):
+    """Забирает одну готовую задачу или возвращает None"""
+    now = timezone.now()
+    # Задачи на пределе не смотрим вовсе, иначе они заслонят остальные в первых CLAIM_CANDIDATES
+    candidates = Task.objects.filter(ready_condition(now)).exclude(name__in=saturated_names(now))
+    if names is not None:
+        candidates = candidates.filter(name__in=names)
+    for task_id, name in candidates.order_by('run_at', 'id').values_list('id', 'name')[:CLAIM_CANDIDATES]:
+        spec = REGISTRY.get(name)
+        timeout = spec.timeout if spec else 0
+        target = Task.objects.filter(ready_condition(now), pk=task_id)
+        if spec and spec.concurrency:
+            # Проверка предела внутри того же UPDATE: два воркера не превысят его одновременно
+            busy = running(now).filter(name=OuterRef('name')).values('name').annotate(count=Count('id')).values('count')
+            target = target.alias(busy=Coalesce(Subquery(busy), 0)).filter(busy__lt=spec.concurrency)
+        claimed = target.update(
+            status='running',
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+
+def run_task(task_row):
+    """Выполняет забранную задачу и записывает итог, если аренда еще принадлежит этому воркеру"""
+    ours = Task.objects.filter(pk=task_row.pk, locked_by=task_row.locked_by, attempts=task_row.attempts)
+    spec = REGISTRY.get(task_row.name)
+    if spec is None:
+        ours.update(status='failed', last_error=f'Неизвестная задача {task_row.name}', finished_at=timezone.now())
+        return False
+    if task_row.attempts > task_row.max_attempts:
+        # Предыдущие попытки не уложились в таймаут, ошибки не было - повторять бесконечно нельзя
+        ours.update(status='failed', last_error='Превышено время выполнения', finished_at=timezone.now())
+        return False
+
+    try:
+        spec.func(**task_row.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if task_row.attempts < task_row.max_attempts:
+            ours.update(status='queued', locked_until=None, last_error=error,
+                        run_at=timezone.now() + retry_delay(task_row.attempts))
+        else:
+            ours.update(status='failed', locked_until=None, last_error=error, finished_at=timezone.now())
+        return False
+
+    ours.update(status='done', locked_until=None, finished_at=timezone.now())
+    return True
+
+
+def run_pending(worker_id='inline', names=None):
+    """Выполняет все готовые задачи в текущем потоке; возвращает число выполненных"""
+    count = 0
+    while True:
+        task_row = claim(worker_id, names)
+        if task_row is None:
+            return count
+        run_task(task_row)
+        count += 1
@@ -0,0 +1,35 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from ..renditions import rendition_name, srcset
+
+register = template.Library()
+
+# Какие размеры предлагать браузеру для места на странице и подсказка sizes
+SLOTS = {
+    'card': (('card', 'gallery'), '(max-width: 576px) 100vw, 400px'),
+    'gallery': (('gallery', 'full'), '(max-width: 992px) 100vw, 800px'),
+}
+
+
+@register.simple_tag
+def photo_img(photo, slot='card', **attrs):
+    """
+    <picture> с WebP и JPEG-копиями фотографии для srcset; пока копий нет - оригинал.
+    Пример: {% photo_img photo 'card' class="card-img-top" alt=car.brand %}
+    """
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if not photo.has_renditions:
+        return format_html('<img src="{}"{}>', photo.image.url, extra)
+
+    sizes, hint = SLOTS[slot]
+    name = photo.image.name
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(name, sizes, 'webp'), hint,
+        default_storage.url(rendition_name(name, sizes[0], 'jpeg')), srcset(name, sizes, 'jpeg'), hint,
+        extra,
+    )
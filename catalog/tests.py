@@ -1,3 +1,1310 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from xml.etree import ElementTree
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from PIL import Image
+
+from PyPDF2 import PdfReader
+from . import agreement_pdf, availability, inventory_index as inventory_index_module
+from .cache import cars_version, inventory_version, page_cache_key
+from .agreement_pdf import FileCache
+from .agreement_store import store_pdf
+from .facets import compute_facets, get_facets
+from .feature_mask import filter_all_features
+from .featured import build_pool, featured_car_ids, featured_pool
+from .forms import CarFilterForm, CarPhotoUploadForm
+from .models import Brand, Car, CarPhoto, Feature, Characteristic, InspectionRequest, PurchaseAgreementRequest, Task
+from .pagination import keyset_paginate
+from .photos import add_photos
+from .queries import published_cars, filter_car_list, car_list_criteria
+from .renditions import delete_renditions, rendition_name, rendition_names
+from .search import search_cars
+from .storage import release_photo_file, walk_files
+from .tasks import claim, enqueue, run_pending, run_task, task
+
+
+def make_car(**kwargs):
+    data = {
+        'brand': 'Toyota',
+        'model': 'Camry',
+        'price': 1500000,
+        'year': 2018,
+        'mileage': 60000,
+        'color': 'Белый',
+        'body_type': 'sedan',
+        'engine_type': 'petrol',
+        'engine_volume': 2.5,
+        'engine_power': 181,
+        'transmission': 'automatic',
+        'drive': 'fwd',
+    }
+    data.update(kwargs)
+    return Car.objects.create(**data)
+
+
+def make_cars_with_photos(count, photos_per_car=3):
+    cars = []
+    for i in range(count):
+        car = make_car(price=1000000 + i)
+        for j in range(photos_per_car):
+            CarPhoto.objects.create(car=car, image=f'car_photos/{car.id}_{j}.jpg', is_main=(j == 1))
+        cars.append(car)
+    return cars
+
+
+class CatalogQueryBudgetTests(TestCase):
+    """Количество запросов на страницу не должно зависеть от числа автомобилей"""
+
+    def assertFlatQueries(self, url, small=2, large=12):
+        make_cars_with_photos(small)
+        with self.assertNumQueries(self.budget) as ctx:
+            self.client.get(url)
+        make_cars_with_photos(large - small)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            self.client.get(url)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_car_list_budget(self):
+        # 3 запроса страницы (обложка - в том же JOIN) + сводка по маркам + 2 на счетчики фильтров
+        self.budget = 6
+        self.assertFlatQueries(reverse('car_list'))
+
+    def test_car_list_filtered_budget(self):
+        self.budget = 6
+        self.assertFlatQueries(reverse('car_list') + '?brand=Toyota&sort=price')
+
+    def test_car_list_warm_facets_budget(self):
+        make_cars_with_photos(3)
+        self.client.get(reverse('car_list'))
+        # Другая сортировка - другая страница, но те же счетчики фильтров и сводка по маркам
+        with self.assertNumQueries(3):
+            self.client.get(reverse('car_list') + '?sort=price')
+
+    def test_index_budget(self):
+        self.budget = 2
+        self.assertFlatQueries(reverse('index'))
+
+    def test_car_detail_budget(self):
+        car = make_car()
+        for i in range(5):
+            CarPhoto.objects.create(car=car, image=f'car_photos/{i}.jpg')
+            car.features.add(Feature.objects.create(name=f'Опция {i}', category='Комфорт' if i % 2 else 'Салон'))
+            car.characteristics.add(Characteristic.objects.create(name=f'Параметр {i}', value=str(i)))
+        # Валидаторы ETag/Last-Modified + автомобиль с обложкой + опции, характеристики;
+        # остальные фото страница не грузит - их подтягивает галерея
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('car_detail', args=[car.id]))
+        self.assertContains(response, 'Комфорт')
+        self.assertContains(response, 'Параметр 4')
+
+    def test_card_shows_main_photo_only(self):
+        car = make_cars_with_photos(1)[0]
+        response = self.client.get(reverse('car_list'))
+        main = car.photos.get(is_main=True)
+        self.assertContains(response, main.image.url)
+        self.assertNotContains(response, f'car_photos/{car.id}_0.jpg')
+
+
+class CatalogIndexPlanTests(TestCase):
+    def test_catalog_queries_use_indexes(self):
+        Feature.objects.create(name='Камера заднего вида')
+        out = StringIO()
+        call_command('explain_catalog_queries', stdout=out)
+        self.assertNotIn('SCAN   ', out.getvalue())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        for i in range(11):
+            # Повторяющиеся значения проверяют тай-брейкер по id
+            make_car(price=1000000 + (i % 3) * 100000, year=2010 + i % 4, mileage=10000 * (i % 5))
+
+    def walk(self, queryset, per_page=4):
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(queryset, cursor, per_page=per_page)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_every_sort_walks_forward_and_back(self):
+        for sort, _label in CarFilterForm.SORT_CHOICES:
+            queryset = published_cars().order_by(sort)
+            expected = list(queryset.order_by(sort, '-id' if sort.startswith('-') else 'id').values_list('id', flat=True))
+            pages = self.walk(queryset)
+            self.assertEqual([car.id for page in pages for car in page], expected, sort)
+
+            back = keyset_paginate(queryset, pages[-1].prev_cursor, per_page=4)
+            self.assertEqual([car.id for car in back], [car.id for car in pages[-2]], sort)
+            self.assertTrue(back.has_next())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        page = keyset_paginate(published_cars().order_by('price'), 'garbage', per_page=4)
+        self.assertFalse(page.has_previous())
+        self.assertEqual(len(page), 4)
+
+    def test_cursor_mode_skips_count(self):
+        for i in range(3):
+            make_car()
+        response = self.client.get(reverse('car_list'), {'paging': 'cursor', 'sort': 'price'})
+        self.assertTrue(response.context['cursor_mode'])
+        self.assertNotContains(response, 'Найдено:')
+        response = self.client.get(reverse('car_list') + '?' + response.context['next_query'])
+        self.assertTrue(response.context['cars'].has_previous())
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.camera = Feature.objects.create(name='Камера')
+        make_car(brand='Toyota', year=2021, country='japan').features.add(self.camera)
+        make_car(brand='Toyota', year=2016, country='japan', transmission='manual')
+        make_car(brand='BMW', year=2008, country='germany', body_type='suv').features.add(self.camera)
+
+    def test_counts(self):
+        facets = compute_facets(published_cars())
+        self.assertEqual(facets['brand'], {'Toyota': 2, 'BMW': 1})
+        self.assertEqual(facets['year_range'], {'2020-': 1, '2015-2019': 1, '-2009': 1})
+        self.assertEqual(facets['body_type'], {'sedan': 2, 'suv': 1})
+        self.assertEqual(facets['features'], {self.camera.id: 2})
+
+    def test_counts_follow_filters_without_duplicates(self):
+        response = self.client.get(reverse('car_list'), {'features': self.camera.id})
+        facets = response.context['facets']
+        self.assertEqual(facets['brand'], {'Toyota': 1, 'BMW': 1})
+        self.assertContains(response, 'Камера (2)')
+        self.assertContains(response, 'Внедорожник (1)')
+
+    def test_cache_is_keyed_by_filters_and_invalidated_on_save(self):
+        params = QueryDict('country=japan&page=2')
+        cars = published_cars().filter(country='japan')
+        self.assertEqual(get_facets(cars, params)['brand'], {'Toyota': 2})
+        with self.assertNumQueries(0):
+            get_facets(cars, QueryDict('page=3&country=japan&sort=price'))
+        make_car(brand='Honda', country='japan')
+        self.assertEqual(get_facets(cars, params)['brand'], {'Toyota': 2, 'Honda': 1})
+
+
+@skipIf(inventory_index_module.np is None, 'numpy не установлен')
+@override_settings(CATALOG_INVENTORY_INDEX=True)
+class InventoryIndexTests(TestCase):
+    QUERIES = [
+        '',
+        'sort=price',
+        'sort=-year&brand=Toyota',
+        'brand=Toyota&model=Corolla',
+        'max_price=1300000&sort=mileage',
+        'year_range=2015-2019&sort=-price',
+        'country=germany&transmission=manual',
+        'body_type=suv&max_mileage=40000',
+        'min_year=2018&engine_type=diesel',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.index = inventory_index_module.inventory_index
+        self.index.synced_version = None
+        self.camera, self.sunroof = Feature.objects.create(name='Камера'), Feature.objects.create(name='Люк')
+        brands = [('Toyota', 'Camry', 'japan'), ('Toyota', 'Corolla', 'japan'), ('BMW', 'X5', 'germany')]
+        for i in range(30):
+            brand, model, country = brands[i % 3]
+            car = make_car(brand=brand, model=model, country=country, price=1000000 + (i * 37 % 11) * 50000,
+                           year=2008 + i % 15, mileage=5000 * (i % 13), body_type=['sedan', 'suv'][i % 2],
+                           transmission=['manual', 'automatic'][i % 2], engine_type=['petrol', 'diesel'][i % 3 % 2])
+            if i % 4 == 0:
+                car.features.add(self.camera)
+            if i % 5 == 0:
+                car.features.add(self.sunroof)
+
+    def assertMatchesOrm(self, query):
+        params = QueryDict(query)
+        form = CarFilterForm(params or None)
+        criteria, sort = car_list_criteria(params, form)
+        orm_ids = list(filter_car_list(published_cars(), params, form).values_list('id', flat=True))
+        index_ids = self.index.search(criteria, sort).tolist()
+        # У ORM нет тай-брейкера, поэтому сравниваем набор и порядок ключа сортировки
+        self.assertCountEqual(index_ids, orm_ids, query)
+        field = sort.lstrip('-')
+        keys = dict(Car.objects.values_list('id', field))
+        self.assertEqual([keys[i] for i in index_ids], [keys[i] for i in orm_ids], query)
+
+    def test_matches_orm(self):
+        for query in self.QUERIES + [f'features={self.camera.id}&features={self.sunroof.id}']:
+            self.assertMatchesOrm(query)
+
+    def test_incremental_updates(self):
+        self.index.ensure_fresh()
+        car = make_car(brand='Lada', model='Vesta', price=900000)
+        car.features.add(self.sunroof)
+        Car.objects.filter(brand='BMW').first().delete()
+        sold = Car.objects.filter(brand='Toyota').first()
+        sold.is_sold = True
+        sold.save()
+        version = self.index.synced_version
+        self.assertEqual(version, cars_version())
+        for query in self.QUERIES + ['brand=Lada', f'features={self.sunroof.id}']:
+            self.assertMatchesOrm(query)
+        self.assertEqual(self.index.synced_version, version)
+
+    def test_photo_and_characteristic_changes_skip_rebuild(self):
+        self.index.ensure_fresh()
+        car = Car.objects.first()
+        CarPhoto.objects.create(car=car, image='car_photos/new.jpg')
+        car.characteristics.add(Characteristic.objects.create(name='Салон', value='Кожа'))
+        with mock.patch.object(self.index, 'rebuild') as rebuild:
+            self.assertMatchesOrm('sort=price')
+        rebuild.assert_not_called()
+
+    def test_car_list_uses_index(self):
+        response = self.client.get(reverse('car_list'), {'sort': 'price', 'page': 2})
+        expected = list(published_cars().order_by('price', 'id').values_list('price', flat=True)[12:24])
+        self.assertEqual([car.price for car in response.context['cars']], expected)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sunroof = Feature.objects.create(name='Панорамный люк')
+        self.camry = make_car(brand='Toyota', model='Camry', generation='XV70', description='Один владелец')
+        self.camry.features.add(self.sunroof)
+        self.x5 = make_car(brand='BMW', model='X5', description='Toyota в подарок не прилагается', price=5000000)
+        self.rio = make_car(brand='Kia', model='Rio', transmission='manual')
+
+    def ids(self, **params):
+        response = self.client.get(reverse('car_list'), params)
+        return [car.id for car in response.context['cars']]
+
+    def test_ranked_by_bm25(self):
+        self.assertEqual(self.ids(q='toyota'), [self.camry.id, self.x5.id])
+
+    def test_prefix_and_feature_names(self):
+        self.assertEqual(self.ids(q='панорам'), [self.camry.id])
+        self.assertEqual(self.ids(q='camry xv70'), [self.camry.id])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.ids(q='toyota', max_price=2000000), [self.camry.id])
+        self.assertEqual(self.ids(q='toyota', sort='-price'), [self.x5.id, self.camry.id])
+
+    def test_index_follows_changes(self):
+        self.rio.features.add(self.sunroof)
+        self.assertCountEqual(self.ids(q='люк'), [self.camry.id, self.rio.id])
+        self.sunroof.name = 'Электролюк'
+        self.sunroof.save()
+        self.assertEqual(self.ids(q='панорамный'), [])
+        self.sunroof.delete()
+        self.assertEqual(self.ids(q='электролюк'), [])
+        self.x5.delete()
+        self.assertEqual(self.ids(q='bmw'), [])
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        response = self.client.get(reverse('admin:catalog_car_changelist'), {'q': 'rio'})
+        self.assertEqual([car.id for car in response.context['cl'].result_list], [self.rio.id])
+
+
+class FeatureMaskTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.heated, self.camera, self.sunroof = [
+            Feature.objects.create(name=name) for name in ('Подогрев сидений', 'Камера', 'Люк')
+        ]
+        self.full = make_car()
+        self.full.features.add(self.heated, self.camera, self.sunroof)
+        self.partial = make_car()
+        self.partial.features.add(self.heated, self.camera)
+
+    def filtered(self, features):
+        params = QueryDict(mutable=True)
+        params.setlist('features', [feature.pk for feature in features])
+        return filter_car_list(published_cars(), params, CarFilterForm(params))
+
+    def test_requires_all_selected_features(self):
+        self.assertCountEqual(self.filtered([self.heated, self.camera]), [self.full, self.partial])
+        cars = self.filtered([self.heated, self.camera, self.sunroof])
+        self.assertEqual(list(cars), [self.full])
+        self.assertNotIn('DISTINCT', str(cars.query))
+        self.assertNotIn('catalog_car_features', str(cars.query))
+
+    def test_mask_follows_m2m_changes(self):
+        self.partial.features.add(self.sunroof)
+        self.assertEqual(len(self.filtered([self.sunroof, self.camera])), 2)
+        self.sunroof.car_set.remove(self.full)
+        self.assertEqual(list(self.filtered([self.sunroof])), [self.partial])
+        self.camera.car_set.clear()
+        self.assertEqual(list(self.filtered([self.camera])), [])
+        self.partial.refresh_from_db()
+        self.assertEqual(self.partial.feature_mask, (1 << self.heated.bit) | (1 << self.sunroof.bit))
+
+    def test_stale_instance_keeps_mask(self):
+        car = Car.objects.get(pk=self.partial.pk)
+        self.partial.features.add(self.sunroof)
+        car.price = 2
+        car.save()
+        self.assertCountEqual(self.filtered([self.sunroof, self.heated, self.camera]), [self.full, self.partial])
+
+    def test_deleted_feature_frees_its_bit(self):
+        bit = self.sunroof.bit
+        self.sunroof.delete()
+        self.full.refresh_from_db()
+        self.assertFalse(self.full.feature_mask & (1 << bit))
+        self.assertEqual(Feature.objects.create(name='Фаркоп').bit, bit)
+
+    def test_features_beyond_mask_width(self):
+        extra = [Feature.objects.create(name=f'Опция {i}') for i in range(62)]
+        overflow = extra[-1]
+        self.assertIsNone(overflow.bit)
+        self.full.features.add(overflow)
+        self.assertEqual(list(self.filtered([self.heated, overflow])), [self.full])
+
+    def test_overflow_feature_taking_freed_bit_refreshes_masks(self):
+        overflow = [Feature.objects.create(name=f'Опция {i}') for i in range(62)][-1]
+        self.full.features.add(overflow)
+        self.sunroof.delete()
+        overflow.name = 'Фаркоп'
+        overflow.save()
+        self.assertIsNotNone(overflow.bit)
+        cars = self.filtered([overflow])
+        self.assertEqual(list(cars), [self.full])
+        self.assertNotIn('catalog_car_features', str(cars.query))
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = make_car()
+
+    def test_anonymous_hits_are_served_from_cache(self):
+        self.client.get(reverse('car_list'), {'brand': 'Toyota', 'sort': 'price'})
+        with self.assertNumQueries(0):
+            self.client.get(reverse('car_list') + '?sort=price&page=1&brand=Toyota&model=')
+            self.client.get(reverse('car_list') + '?sort=price&brand=Toyota')
+
+    def test_defaults_share_a_key(self):
+        self.client.get(reverse('car_list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('car_list') + '?page=1&sort=-created_at')
+
+    def test_explicit_sort_differs_from_search_default(self):
+        factory = RequestFactory()
+        search = page_cache_key(factory.get(reverse('car_list'), {'q': 'camry'}))
+        self.assertNotEqual(search, page_cache_key(factory.get(reverse('car_list'), {'q': 'camry', 'sort': '-created_at'})))
+        self.assertEqual(search, page_cache_key(factory.get(reverse('car_list'), {'q': 'camry', 'sort': 'search_rank'})))
+
+    def test_inventory_changes_expire_pages(self):
+        url = reverse('car_detail', args=[self.car.id])
+        self.client.get(url)
+        for change in (
+            lambda: CarPhoto.objects.create(car=self.car, image='car_photos/new.jpg'),
+            lambda: self.car.characteristics.add(Characteristic.objects.create(name='Салон', value='Кожа')),
+            lambda: Feature.objects.create(name='Фаркоп'),
+            lambda: Car.objects.filter(pk=self.car.pk).first().save(),
+        ):
+            change()
+            with self.assertNumQueries(4):
+                self.client.get(url)
+
+    def test_admin_list_editable_expires_pages(self):
+        self.client.get(reverse('index'))
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:catalog_car_changelist'), {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+            'form-0-id': self.car.id, 'form-0-price': '999000', 'form-0-is_published': 'on',
+            '_save': 'Сохранить',
+        })
+        self.client.logout()
+        self.assertContains(self.client.get(reverse('index')), '999000')
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.force_login(User.objects.create_user('buyer', password='pass'))
+        self.client.get(reverse('car_list'))
+        response = self.client.get(reverse('car_list'))
+        self.assertTrue(response.context)
+
+
+class CatalogMetadataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_car(brand='Toyota', model='Camry', price=1500000, year=2018, mileage=60000)
+        make_car(brand='Toyota', model='Corolla', price=900000, year=2012, mileage=150000)
+        make_car(brand='BMW', model='X5', price=4000000, year=2021, mileage=20000)
+        make_car(brand='Lada', model='Vesta', is_sold=True)
+
+    def test_structure(self):
+        data = self.client.get(reverse('catalog_metadata')).json()
+        self.assertEqual(data['brands'], [
+            {'name': 'BMW', 'count': 1, 'models': [{'name': 'X5', 'count': 1}]},
+            {'name': 'Toyota', 'count': 2, 'models': [{'name': 'Camry', 'count': 1}, {'name': 'Corolla', 'count': 1}]},
+        ])
+        self.assertEqual(data['price'], {'min': 900000, 'max': 4000000})
+        self.assertEqual(data['year'], {'min': 2012, 'max': 2021})
+
+    def test_etag_revalidation(self):
+        response = self.client.get(reverse('catalog_metadata'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('catalog_metadata'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        make_car(brand='Kia', model='Rio')
+        response = self.client.get(reverse('catalog_metadata'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_form_and_models_endpoint_share_metadata(self):
+        CarFilterForm()
+        with self.assertNumQueries(0):
+            form = CarFilterForm({'brand': 'Toyota'})
+            models = self.client.get(reverse('get_models'), {'brand': 'Toyota'}).json()['models']
+        self.assertEqual([value for value, _label in form.fields['brand'].choices], ['', 'BMW', 'Toyota'])
+        self.assertEqual(models, ['Camry', 'Corolla'])
+
+
+class FeaturedPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_small_inventory_is_taken_whole(self):
+        cars = [make_car() for _ in range(5)]
+        make_car(is_sold=True)
+        self.assertCountEqual(build_pool(size=10), [car.id for car in cars])
+
+    def test_large_inventory_is_probed(self):
+        cars = [make_car(is_published=i % 4 != 0) for i in range(40)]
+        published = {car.id for car in cars if car.is_published}
+        pool = build_pool(size=8, rng=random.Random(1))
+        self.assertEqual(len(pool), 8)
+        self.assertLessEqual(set(pool), published)
+
+    def test_pool_is_cached_until_inventory_changes(self):
+        make_car()
+        featured_car_ids()
+        with self.assertNumQueries(0):
+            featured_car_ids()
+        car = make_car()
+        self.assertIn(car.id, featured_pool())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = make_car()
+        self.url = reverse('car_detail', args=[self.car.id])
+
+    def test_car_detail_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_car_detail_etag_changes_with_photos_and_features(self):
+        etag = self.client.get(self.url)['ETag']
+        CarPhoto.objects.create(car=self.car, image='car_photos/new.jpg')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.car.features.add(Feature.objects.create(name='Люк'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_unpublished_car_is_404(self):
+        self.car.is_published = False
+        self.car.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_available_times_not_modified_until_booking(self):
+        url = reverse('get_available_times')
+        response = self.client.get(url, {'date': '2030-01-07'})
+        self.assertEqual(len(response.json()['available_times']), 8)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'date': '2030-01-07'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        InspectionRequest.objects.create(car=self.car, full_name='Иванов', phone='+7 (999) 123-45-67',
+                                         inspection_date='2030-01-07', inspection_time='09:00-10:00')
+        response = self.client.get(url, {'date': '2030-01-07'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['available_times']), 7)
+
+    def test_get_models_not_modified(self):
+        url = reverse('get_models')
+        etag = self.client.get(url, {'brand': 'Toyota'})['ETag']
+        self.assertEqual(self.client.get(url, {'brand': 'Toyota'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class CarsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cars = [make_car(brand='Toyota' if i % 2 else 'BMW', price=1000000 + i * 1000) for i in range(7)]
+        make_car(is_sold=True)
+
+    def test_projection_only_loads_requested_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('api_cars'), {'fields': 'brand,price', 'brand': 'BMW'}).json()
+        self.assertEqual(set(data['results'][0]), {'brand', 'price'})
+        self.assertEqual(len(data['results']), 4)
+        self.assertNotIn('description', ctx.captured_queries[-1]['sql'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api_cars'), {'fields': 'price,feature_mask'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_numbers_are_rejected(self):
+        response = self.client.get(reverse('api_cars'), {'max_price': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_price', response.json()['fields'])
+        self.assertEqual(self.client.get(reverse('car_list'), {'min_year': 'x'}).status_code, 200)
+        data = self.client.get(reverse('api_cars'), {'max_price': 1002000, 'fields': 'id'}).json()
+        self.assertEqual(len(data['results']), 3)
+
+    def test_keyset_pages(self):
+        url = reverse('api_cars')
+        seen, params = [], {'sort': '-price', 'limit': 3, 'fields': 'id'}
+        while True:
+            data = self.client.get(url, params).json()
+            seen += [row['id'] for row in data['results']]
+            if not data['has_more']:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(seen, [car.id for car in reversed(self.cars)])
+
+    def test_jsonl_stream(self):
+        response = self.client.get(reverse('api_cars'), {'format': 'jsonl', 'fields': 'id,created_at'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'created_at'})
+
+
+class InventoryExportTests(TestCase):
+    def setUp(self):
+        self.cars = make_cars_with_photos(3, photos_per_car=2)
+        self.feature = Feature.objects.create(name='Круиз-контроль')
+        self.cars[0].features.add(self.feature)
+        make_car(is_sold=True)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_inventory', '--base-url', 'https://example.com', *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_has_photos_and_features(self):
+        rows = list(csv.DictReader(StringIO(self.export('--format', 'csv'))))
+        self.assertEqual(len(rows), 3)
+        row = next(row for row in rows if row['id'] == str(self.cars[0].pk))
+        self.assertEqual(row['features'], 'Круиз-контроль')
+        self.assertEqual(len(row['photos'].split('|')), 2)
+        self.assertTrue(row['url'].startswith('https://example.com/'))
+
+    def test_queries_do_not_grow_with_inventory(self):
+        with CaptureQueriesContext(connection) as small:
+            self.export('--format', 'jsonl')
+        make_cars_with_photos(5)
+        with CaptureQueriesContext(connection) as large:
+            self.export('--format', 'jsonl')
+        self.assertEqual(len(small), len(large))
+
+    def test_since_includes_sold_cars(self):
+        Car.objects.filter(pk=self.cars[1].pk).update(is_sold=True, updated_at=timezone.now() + timedelta(days=1))
+        since = (timezone.now() + timedelta(hours=1)).isoformat()
+        lines = self.export('--format', 'jsonl', '--since', since).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.cars[1].pk])
+        self.assertFalse(json.loads(lines[0])['available'])
+
+    def test_since_includes_photo_and_feature_changes(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        Car.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        since = timezone.now().isoformat()
+        with override_settings(MEDIA_ROOT=media):
+            add_photos(self.cars[0], [jpeg_upload()])
+        self.cars[1].photos.first().delete()
+        self.cars[2].features.add(self.feature)
+        lines = self.export('--format', 'jsonl', '--since', since).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [car.pk for car in self.cars])
+
+    def test_yml_feed_is_valid_xml(self):
+        root = ElementTree.fromstring(self.export('--format', 'yml'))
+        offers = root.findall('./shop/offers/offer')
+        self.assertEqual(len(offers), 3)
+        self.assertEqual(len(offers[0].findall('picture')), 2)
+
+    def test_admin_view_requires_staff(self):
+        url = reverse('admin:catalog_car_export')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 4)
+        self.assertEqual(self.client.get(url, {'format': 'xls'}).status_code, 400)
+
+
+class ImportCarsTests(TestCase):
+    HEADER = 'id,brand,model,price,year,mileage,color,body_type,engine_type,engine_volume,engine_power,transmission,drive,features,characteristics\n'
+
+    def write_csv(self, lines):
+        path = os.path.join(self.tmp, 'cars.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.HEADER + ''.join(line + '\n' for line in lines))
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_creates_cars_with_country_features_and_search(self):
+        version = inventory_version()
+        path = self.write_csv([
+            ',BMW,X5,4500000,2020,30000,Черный,suv,diesel,3.0,249,automatic,awd,Люк|Круиз-контроль,ПТС: Оригинал',
+            ',Lada,Vesta,1200000,2021,15000,Белый,sedan,petrol,1.6,106,manual,fwd,Круиз-контроль,',
+        ])
+        out = StringIO()
+        call_command('import_cars', path, stdout=out)
+        self.assertIn('Создано: 2', out.getvalue())
+
+        bmw = Car.objects.get(brand='BMW')
+        self.assertEqual(bmw.country, 'germany')
+        self.assertEqual(Car.objects.get(brand='Lada').country, 'russia')
+        self.assertEqual(Feature.objects.filter(name='Круиз-контроль').count(), 1)
+        self.assertEqual(set(bmw.features.values_list('name', flat=True)), {'Люк', 'Круиз-контроль'})
+        self.assertEqual(str(bmw.characteristics.get()), 'ПТС: Оригинал')
+        cruise = Feature.objects.get(name='Круиз-контроль')
+        self.assertEqual(list(filter_all_features(Car.objects.all(), [cruise.pk]).order_by('id')),
+                         list(Car.objects.order_by('id')))
+        self.assertEqual(list(search_cars(Car.objects.all(), 'веста')), [])
+        self.assertEqual(list(search_cars(Car.objects.all(), 'vesta')), [Car.objects.get(brand='Lada')])
+        self.assertNotEqual(inventory_version(), version)
+
+    def test_existing_id_is_updated(self):
+        car = make_car()
+        car.features.add(Feature.objects.create(name='Подогрев'))
+        path = self.write_csv([f'{car.pk},Toyota,Camry,999000,2018,70000,Белый,sedan,petrol,2.5,181,automatic,fwd,Люк,'])
+        call_command('import_cars', path, stdout=StringIO())
+        car.refresh_from_db()
+        self.assertEqual(car.price, 999000)
+        self.assertEqual(list(car.features.values_list('name', flat=True)), ['Люк'])
+        self.assertEqual(car.feature_mask, 1 << Feature.objects.get(name='Люк').bit)
+
+    def test_invalid_rows_abort_whole_import(self):
+        path = self.write_csv([
+            ',BMW,X5,4500000,2020,30000,Черный,suv,diesel,3.0,249,automatic,awd,,',
+            ',BMW,X6,дорого,2020,30000,Черный,tank,diesel,3.0,249,automatic,awd,,',
+        ])
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_cars', path, stdout=StringIO(), stderr=err)
+        self.assertIn('строка 3: price', err.getvalue())
+        self.assertIn('строка 3: body_type', err.getvalue())
+        self.assertFalse(Car.objects.exists())
+
+    def test_queries_do_not_grow_with_rows(self):
+        line = ',Kia,Rio,900000,2019,50000,Серый,sedan,petrol,1.6,123,automatic,fwd,Люк|Парктроник,Цвет салона: Черный'
+        with CaptureQueriesContext(connection) as small:
+            call_command('import_cars', self.write_csv([line] * 5), stdout=StringIO())
+        with CaptureQueriesContext(connection) as large:
+            call_command('import_cars', self.write_csv([line] * 50), stdout=StringIO())
+        self.assertEqual(Car.objects.count(), 55)
+        self.assertEqual(Feature.objects.count(), 2)
+        self.assertLessEqual(len(large), len(small))
+
+
+class BrandCountryTests(TestCase):
+    def setUp(self):
+        # Справочник марок кэшируется, а транзакция теста откатывается - кэш не должен пережить тест
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_save_and_bulk_create_derive_country(self):
+        self.assertEqual(make_car(brand='Kia').country, 'korea')
+        car = make_car()
+        car.pk, car.brand, car.country = None, 'Ferrari', 'other'
+        Car.objects.bulk_create([car])
+        self.assertEqual(Car.objects.get(pk=car.pk).country, 'italy')
+        self.assertEqual(make_car(brand='Tesla', country='usa').country, 'other')
+
+    def test_brand_change_updates_cars(self):
+        car = make_car(brand='Haval')
+        self.assertEqual(car.country, 'other')
+        brand = Brand.objects.create(name='Haval', country='korea')
+        car.refresh_from_db()
+        self.assertEqual(car.country, 'korea')
+        version = inventory_version()
+        brand.country = 'japan'
+        brand.save()
+        car.refresh_from_db()
+        self.assertEqual(car.country, 'japan')
+        self.assertNotEqual(inventory_version(), version)
+
+    def test_brand_rename_updates_cars_with_old_name(self):
+        brand = Brand.objects.create(name='Haval', country='korea')
+        car = make_car(brand='Haval')
+        brand.name = 'Havall'
+        brand.save()
+        car.refresh_from_db()
+        self.assertEqual(car.country, 'other')
+
+    def test_refresh_command_uses_one_update_per_country(self):
+        make_car(brand='BMW')
+        make_car(brand='Lada')
+        Car.objects.update(country='other')
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('refresh_car_countries', stdout=StringIO())
+        updates = [query for query in ctx.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), len(Car.COUNTRY_CHOICES))
+        self.assertEqual(dict(Car.objects.values_list('brand', 'country')), {'BMW': 'germany', 'Lada': 'russia'})
+
+
+def jpeg_upload(name='photo.jpg', size=(2000, 1500)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class PhotoRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+
+    def test_upload_renders_all_sizes_without_upscaling(self):
+        photo = CarPhoto.objects.create(car=self.car, image=jpeg_upload())
+        self.assertFalse(photo.has_renditions)
+        run_pending()
+        photo.refresh_from_db()
+        self.assertTrue(photo.has_renditions)
+        for name in rendition_names(photo.image.name):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(rendition_name(photo.image.name, 'card', 'webp')) as card:
+            self.assertEqual(Image.open(card).size, (400, 300))
+
+        small = CarPhoto.objects.create(car=self.car, image=jpeg_upload(size=(300, 200)))
+        run_pending()
+        with default_storage.open(rendition_name(small.image.name, 'full', 'jpeg')) as full:
+            self.assertEqual(Image.open(full).size, (300, 200))
+
+    def test_tag_emits_srcset_or_falls_back_to_original(self):
+        template = Template("{% load photos %}{% photo_img photo 'card' class='card-img-top' %}")
+        photo = CarPhoto.objects.create(car=self.car, image=jpeg_upload())
+        run_pending()
+        photo.refresh_from_db()
+        html = template.render(Context({'photo': photo}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('.card.webp 400w', html)
+        self.assertIn('.gallery.jpg 800w', html)
+
+        photo.has_renditions = False
+        html = template.render(Context({'photo': photo}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(photo.image.url, html)
+
+    def test_backfill_command(self):
+        photo = CarPhoto.objects.create(car=self.car, image=jpeg_upload())
+        run_pending()
+        delete_renditions(photo.image.name)
+        CarPhoto.objects.filter(pk=photo.pk).update(has_renditions=False)
+
+        call_command('render_photo_renditions', '--workers', '2', stdout=StringIO())
+        photo.refresh_from_db()
+        self.assertTrue(photo.has_renditions)
+        self.assertTrue(default_storage.exists(rendition_name(photo.image.name, 'gallery', 'webp')))
+
+
+FLAKY_CALLS = []
+
+
+@task('tests.flaky', max_attempts=2, timeout=30)
+def flaky(fail_times=0):
+    FLAKY_CALLS.append(fail_times)
+    if len(FLAKY_CALLS) <= fail_times:
+        raise RuntimeError('сбой')
+
+
+@task('tests.heavy', timeout=30, concurrency=1)
+def heavy():
+    pass
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_concurrency_cap_does_not_block_other_tasks(self):
+        first, second = enqueue('tests.heavy'), enqueue('tests.heavy')
+        other = enqueue('tests.flaky')
+        self.assertEqual(claim('worker-1').pk, first.pk)
+        # Вторая тяжелая задача ждет, пока идет первая, но очередь за ней не стоит
+        self.assertEqual(claim('worker-2').pk, other.pk)
+        self.assertIsNone(claim('worker-3'))
+
+        Task.objects.filter(pk=first.pk).update(status='done')
+        self.assertEqual(claim('worker-3').pk, second.pk)
+
+    def test_claim_is_exclusive(self):
+        enqueue('tests.flaky')
+        first = claim('worker-1')
+        self.assertIsNotNone(first)
+        self.assertIsNone(claim('worker-2'))
+        self.assertTrue(run_task(first))
+        self.assertEqual(Task.objects.get().status, 'done')
+
+    def test_retry_with_backoff_then_fail(self):
+        enqueue('tests.flaky', fail_times=5)
+        self.assertFalse(run_task(claim('worker')))
+        row = Task.objects.get()
+        self.assertEqual(row.status, 'queued')
+        self.assertIn('RuntimeError', row.last_error)
+        self.assertGreater(row.run_at, timezone.now())
+        self.assertIsNone(claim('worker'))
+
+        Task.objects.update(run_at=timezone.now())
+        self.assertFalse(run_task(claim('worker')))
+        self.assertEqual(Task.objects.get().status, 'failed')
+
+    def test_expired_lease_is_reclaimed(self):
+        enqueue('tests.flaky')
+        stale = claim('dead-worker')
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        fresh = claim('worker')
+        self.assertEqual(fresh.attempts, 2)
+        self.assertTrue(run_task(fresh))
+        # Запоздавший воркер не перезаписывает чужой результат
+        Task.objects.update(status='running')
+        run_task(stale)
+        self.assertEqual(Task.objects.get().status, 'running')
+
+
+class RunWorkerTests(TransactionTestCase):
+    # Потоки воркера работают в своих соединениях и не видят данные в открытой транзакции TestCase
+    serialized_rollback = True  # справочник марок заполняется миграцией - вернуть его после очистки базы
+
+    def test_run_worker_burst(self):
+        for _ in range(3):
+            enqueue('tests.flaky')
+        out = StringIO()
+        call_command('run_worker', '--burst', '--concurrency', '1', stdout=out)
+        self.assertEqual(Task.objects.filter(status='done').count(), 3)
+        self.assertIn('Выполнено задач: 3', out.getvalue())
+
+
+class PurchaseAgreementTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+
+    buyer = {
+        'buyer_full_name': 'Иванов Иван Иванович',
+        'buyer_passport_series': '0101',
+        'buyer_passport_number': '123456',
+        'buyer_passport_issued': 'ОВД',
+        'buyer_registration_address': 'Барнаул',
+    }
+
+    def test_post_enqueues_and_status_serves_pdf_when_ready(self):
+        response = self.client.post(reverse('purchase_agreement', args=[self.car.id]), self.buyer)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Task.objects.get().name, 'catalog.render_agreement')
+        self.assertFalse(PurchaseAgreementRequest.objects.get().pdf)
+
+        waiting = self.client.get(response['Location'])
+        self.assertContains(waiting, 'Договор готовится')
+
+        run_pending()
+        ready = self.client.get(response['Location'], follow=True)
+        self.assertEqual(ready['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(ready.streaming_content).startswith(b'%PDF'))
+
+    def test_json_post_returns_job_and_status_redirects_when_done(self):
+        response = self.client.post(reverse('purchase_agreement', args=[self.car.id]), self.buyer,
+                                    HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], 'queued')
+
+        with self.assertNumQueries(1):
+            polled = self.client.get(job['status_url'])
+        self.assertEqual(polled.json()['status'], 'queued')
+        self.assertIn('no-store', polled['Cache-Control'])
+
+        run_pending()
+        done = self.client.get(job['status_url'])
+        self.assertEqual(done.status_code, 302)
+        self.assertEqual(self.client.get(done['Location'])['Content-Type'], 'application/pdf')
+
+        invalid = self.client.post(reverse('purchase_agreement', args=[self.car.id]), {},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(invalid.status_code, 400)
+        self.assertIn('buyer_full_name', invalid.json()['errors'])
+
+    def ready_agreement(self):
+        status_url = self.client.post(reverse('purchase_agreement', args=[self.car.id]), self.buyer)['Location']
+        run_pending()
+        return PurchaseAgreementRequest.objects.get(), self.client.get(status_url)['Location']
+
+    def test_download_supports_range_and_etag(self):
+        agreement, url = self.ready_agreement()
+        full = self.client.get(url)
+        content = b''.join(full.streaming_content)
+        self.assertEqual(int(full['Content-Length']), len(content))
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertIn('private', full['Cache-Control'])
+
+        part = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part['Content-Range'], f'bytes 100-199/{len(content)}')
+        self.assertEqual(b''.join(part.streaming_content), content[100:200])
+        tail = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(tail.streaming_content), content[-10:])
+        stale = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(content)}-').status_code, 416)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+
+    def test_same_data_reuses_stored_pdf(self):
+        agreement, url = self.ready_agreement()
+        again = self.client.post(reverse('purchase_agreement', args=[self.car.id]), self.buyer)
+        self.assertRedirects(again, url, fetch_redirect_response=False)
+        self.assertEqual(PurchaseAgreementRequest.objects.count(), 1)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_changed_data_rerenders_and_releases_old_file(self):
+        agreement, url = self.ready_agreement()
+        old_name = agreement.pdf.name
+        PurchaseAgreementRequest.objects.filter(pk=agreement.pk).update(car_vin='XTA21099000000001')
+
+        status = self.client.get(url)
+        self.assertRedirects(status, reverse('agreement_status', args=[url.split('/')[-3]]),
+                             fetch_redirect_response=False)
+        self.client.get(status['Location'])
+        with self.captureOnCommitCallbacks(execute=True):
+            run_pending()
+        agreement.refresh_from_db()
+        self.assertNotEqual(agreement.pdf.name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_tampered_token_is_404(self):
+        self.assertEqual(self.client.get(reverse('agreement_status', args=['1:abc'])).status_code, 404)
+
+
+class AgreementPdfTests(TestCase):
+    def test_file_cache_reloads_on_mtime_change(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'template.txt')
+        with open(path, 'w') as f:
+            f.write('v1')
+        loads = []
+
+        def loader(path):
+            loads.append(path)
+            with open(path) as f:
+                return f.read()
+
+        cache_entry = FileCache(loader, lambda: (path,))
+        self.assertEqual(cache_entry.get(), 'v1')
+        self.assertEqual(cache_entry.get(), 'v1')
+        self.assertEqual(len(loads), 1)
+
+        with open(path, 'w') as f:
+            f.write('v2')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        self.assertEqual(cache_entry.get(), 'v2')
+        self.assertEqual(len(loads), 2)
+
+    def test_overlay_is_stamped_on_template(self):
+        agreement = PurchaseAgreementRequest(
+            car=make_car(), buyer_full_name='Иванов Иван Иванович', buyer_passport_series='0101',
+            buyer_passport_number='123456', buyer_passport_issued='ОВД', buyer_registration_address='Барнаул',
+            seller_full_name='Петров Петр', seller_passport_series='0202', seller_passport_number='654321',
+            seller_passport_issued='ОВД', seller_registration_address='Бийск',
+            car_brand='Toyota', car_model='Camry', car_year=2018, car_price=1500000, car_vin='JTNB11HK0J3000000',
+        )
+        first = agreement_pdf.render_agreement_pdf(agreement)
+        second = agreement_pdf.render_agreement_pdf(agreement)
+        self.assertEqual(len(PdfReader(BytesIO(second)).pages), 1)
+        text = PdfReader(BytesIO(first)).pages[0].extract_text()
+        self.assertIn('Договор купли-продажи', text)
+        self.assertIn('Иванов Иван Иванович', text)
+        self.assertIn('JTNB11HK0J3000000', text)
+
+
+class AgreementArchiveTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+        self.agreements = [
+            PurchaseAgreementRequest.objects.create(
+                car=self.car, buyer_full_name=f'Покупатель {i}', buyer_passport_series='0101',
+                buyer_passport_number='123456', buyer_passport_issued='ОВД', buyer_registration_address='Барнаул',
+                seller_full_name='Петров Петр', seller_passport_series='0202', seller_passport_number='654321',
+                seller_passport_issued='ОВД', seller_registration_address='Бийск',
+                car_brand='Toyota', car_model='Camry', car_year=2018, car_price=1500000,
+            )
+            for i in range(3)
+        ]
+        store_pdf(self.agreements[0], b'%PDF-stored')
+
+    def test_command_writes_zip_in_order(self):
+        output = os.path.join(tempfile.mkdtemp(), 'agreements.zip')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command('export_agreements', output, '--workers', '2', stdout=StringIO())
+
+        with zipfile.ZipFile(output) as archive:
+            names = archive.namelist()
+            self.assertEqual([name.split('-')[0] for name in names], [str(a.pk) for a in self.agreements])
+            self.assertEqual(archive.read(names[0]), b'%PDF-stored')
+            rendered = PdfReader(BytesIO(archive.read(names[2]))).pages[0].extract_text()
+        self.assertIn('Покупатель 2', rendered)
+
+    def test_admin_action_streams_zip(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:catalog_purchaseagreementrequest_changelist'), {
+            'action': 'download_agreements',
+            '_selected_action': [self.agreements[0].pk, self.agreements[1].pk],
+        })
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+
+class PhotoStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_duplicates_share_one_sharded_file(self):
+        first = CarPhoto.objects.create(car=make_car(), image=jpeg_upload('IMG_1.JPG'))
+        second = CarPhoto.objects.create(car=make_car(), image=jpeg_upload('copy.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        digest = os.path.basename(first.image.name).split('.')[0]
+        self.assertEqual(first.image.name, f'car_photos/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(len(list(walk_files('car_photos'))), 1)
+
+    @override_settings(CATALOG_PHOTO_RELEASE_GRACE=0)
+    def test_file_removed_with_last_reference(self):
+        car, other = make_car(), make_car()
+        photo = CarPhoto.objects.create(car=car, image=jpeg_upload())
+        CarPhoto.objects.create(car=other, image=jpeg_upload())
+        run_pending()
+        with self.captureOnCommitCallbacks(execute=True):
+            car.delete()
+        self.assertTrue(default_storage.exists(photo.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(default_storage.exists(photo.image.name))
+        self.assertFalse(default_storage.exists(rendition_name(photo.image.name, 'card', 'webp')))
+
+    def test_recently_reused_file_survives_release(self):
+        photo = CarPhoto.objects.create(car=make_car(), image=jpeg_upload())
+        path = default_storage.path(photo.image.name)
+        os.utime(path, (0, 0))
+        # Параллельная загрузка сохранила тот же файл, но ее строка еще не закоммичена
+        name = CarPhoto._meta.get_field('image').storage.save('car_photos/copy.jpg', jpeg_upload('copy.jpg'))
+        self.assertEqual(name, photo.image.name)
+        photo.delete()
+        self.assertFalse(release_photo_file(name))
+        self.assertTrue(default_storage.exists(name))
+
+        os.utime(path, (0, 0))
+        self.assertTrue(release_photo_file(name))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_gc_removes_orphans_only(self):
+        photo = CarPhoto.objects.create(car=make_car(), image=jpeg_upload())
+        default_storage.save('car_photos/legacy.jpg', ContentFile(b'old'))
+        default_storage.save('car_photos/legacy.card.webp', ContentFile(b'old'))
+        call_command('gc_photo_files', '--grace-minutes', '0', stdout=StringIO())
+        self.assertEqual([name for name, _mtime in walk_files('car_photos')], [photo.image.name])
+
+
+class PhotoUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+        self.url = reverse('upload_car_photos', args=[self.car.id])
+
+    def test_batch_is_one_insert_with_single_main(self):
+        files = [jpeg_upload(f'{i}.jpg', size=(100 + i, 100)) for i in range(3)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'images': files})
+        self.assertEqual(response.status_code, 302)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "catalog_carphoto"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.car.photos.count(), 3)
+        self.assertEqual(self.car.photos.filter(is_main=True).count(), 1)
+        self.assertEqual(Task.objects.filter(name='catalog.render_photo').count(), 3)
+
+        self.client.post(self.url, {'images': [jpeg_upload('more.jpg', size=(50, 50))]})
+        self.assertEqual(self.car.photos.filter(is_main=True).count(), 1)
+
+    def test_corrupt_file_rejects_whole_batch(self):
+        broken = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(self.url, {'images': [jpeg_upload(), broken]})
+        self.assertContains(response, 'broken.jpg: файл поврежден')
+        self.assertFalse(self.car.photos.exists())
+
+    def test_limit_counts_existing_photos(self):
+        CarPhoto.objects.bulk_create([CarPhoto(car=self.car, image=f'car_photos/{i}.jpg') for i in range(19)])
+        response = self.client.post(self.url, {'images': [jpeg_upload('a.jpg'), jpeg_upload('b.jpg')]})
+        self.assertContains(response, 'не больше 20 фотографий')
+        self.assertEqual(self.car.photos.count(), 19)
+
+    def test_add_photos_rechecks_limit_under_lock(self):
+        # Форма проверила лимит до того, как параллельная загрузка заняла последние места
+        files = MultiValueDict({'images': [jpeg_upload('a.jpg'), jpeg_upload('b.jpg')]})
+        form = CarPhotoUploadForm({}, files, car=self.car)
+        self.assertTrue(form.is_valid())
+        CarPhoto.objects.bulk_create([CarPhoto(car=self.car, image=f'car_photos/{i}.jpg') for i in range(19)])
+        with self.assertRaisesMessage(ValidationError, 'не больше 20 фотографий'):
+            form.save_photos(self.car)
+        self.assertEqual(self.car.photos.count(), 19)
+
+    def test_main_moves_on_save_and_delete(self):
+        first = CarPhoto.objects.create(car=self.car, image='car_photos/1.jpg', is_main=True)
+        second = CarPhoto.objects.create(car=self.car, image='car_photos/2.jpg', is_main=True)
+        first.refresh_from_db()
+        self.assertFalse(first.is_main)
+        second.delete()
+        first.refresh_from_db()
+        self.assertTrue(first.is_main)
+
+    def test_cover_photo_follows_main(self):
+        self.client.post(self.url, {'images': [jpeg_upload('a.jpg', size=(60, 60)), jpeg_upload('b.jpg', size=(70, 70))]})
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.cover_photo, self.car.photos.get(is_main=True))
+
+        other = self.car.photos.get(is_main=False)
+        other.is_main = True
+        other.save()
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.cover_photo, other)
+
+        other.delete()
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.cover_photo, self.car.photos.get())
+        self.car.photos.get().delete()
+        self.car.refresh_from_db()
+        self.assertIsNone(self.car.cover_photo)
+
+
+class CarGalleryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = make_car()
+        for i in range(8):
+            CarPhoto.objects.create(car=self.car, image=f'car_photos/{i}.jpg', is_main=(i == 3))
+
+    def test_pages_start_with_main_photo(self):
+        url = reverse('car_gallery', args=[self.car.id])
+        first = self.client.get(url, {'limit': 5}).json()
+        self.assertEqual(first['count'], 8)
+        self.assertTrue(first['has_next'])
+        self.assertEqual(len(first['results']), 5)
+        self.assertTrue(first['results'][0]['is_main'])
+        self.assertEqual(first['results'][0]['original'], '/media/car_photos/3.jpg')
+
+        second = self.client.get(url, {'limit': 5, 'page': 2}).json()
+        self.assertFalse(second['has_next'])
+        ids = [photo['id'] for photo in first['results'] + second['results']]
+        self.assertCountEqual(ids, self.car.photos.values_list('id', flat=True))
+
+    def test_unpublished_car_is_404(self):
+        Car.objects.filter(pk=self.car.pk).update(is_published=False)
+        response = self.client.get(reverse('car_gallery', args=[self.car.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_page_does_not_load_gallery(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('car_list'))
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "catalog_carphoto"' in q['sql']])
+        self.assertContains(response, reverse('car_gallery', args=[self.car.id]))
+
+
+class InspectionAvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = make_car()
+        self.url = reverse('inspection_availability')
+
+    def book(self, date, time, status='pending'):
+        return InspectionRequest.objects.create(car=self.car, full_name='Иванов', phone='+7 (999) 123-45-67',
+                                                inspection_date=date, inspection_time=time, status=status)
+
+    def test_month_masks_in_one_query(self):
+        self.book('2030-01-07', '09:00-10:00')
+        self.book('2030-01-07', '10:00-11:00', status='confirmed')
+        self.book('2030-01-08', '16:00-17:00', status='cancelled')
+
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {'start': '2030-01-07', 'days': 14}).json()
+        # Две недели с понедельника: 10 рабочих дней, выходные пропущены
+        self.assertEqual(len(data['days']), 10)
+        self.assertNotIn('2030-01-12', data['days'])
+        self.assertEqual(data['days']['2030-01-07'], 0b11111100)
+        self.assertEqual(data['days']['2030-01-08'], 0b11111111)
+        self.assertEqual(availability.free_slots(data['days']['2030-01-07']), data['slots'][2:])
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'start': '2030-01-07', 'days': 14})
+        self.book('2030-01-08', '16:00-17:00')
+        data = self.client.get(self.url, {'start': '2030-01-07', 'days': 14}).json()
+        self.assertEqual(data['days']['2030-01-08'], 0b01111111)
+
+    def test_range_is_clamped_and_validated(self):
+        data = self.client.get(self.url, {'start': '2030-01-07', 'days': 365}).json()
+        # 60 дней с понедельника: 8 полных недель и еще понедельник-четверг
+        self.assertEqual(len(data['days']), 8 * 5 + 4)
+        past = self.client.get(self.url, {'start': '2000-01-01', 'days': 1}).json()
+        self.assertEqual(past['start'], timezone.localdate().isoformat())
+        self.assertEqual(self.client.get(self.url, {'start': '07.01.2030'}).status_code, 400)
+
+    def test_non_integer_days_falls_back_to_default(self):
+        response = self.client.get(self.url, {'start': '2030-01-07', 'days': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        # 31 день с понедельника: 4 полные недели и еще понедельник-среда
+        self.assertEqual(len(response.json()['days']), 4 * 5 + 3)
@@ -6,8 +6,15 @@ urlpatterns = [
     path('catalog/', views.car_list, name='car_list'),
     path('car/<int:car_id>/', views.car_detail, name='car_detail'),
     path('car/<int:car_id>/agreement/', views.purchase_agreement, name='purchase_agreement'),
+    path('agreement/jobs/<str:job_id>/', views.agreement_job, name='agreement_job'),
+    path('agreement/<str:token>/', views.agreement_status, name='agreement_status'),
+    path('agreement/<str:token>/pdf/', views.agreement_download, name='agreement_download'),
     path('api/models/', views.get_models, name='get_models'),
+    path('api/cars/', views.api_cars, name='api_cars'),
+    path('api/cars/<int:car_id>/photos/', views.car_gallery, name='car_gallery'),
+    path('api/catalog-meta/', views.catalog_metadata, name='catalog_metadata'),
     path('car/<int:car_id>/inspection/', views.inspection_request, name='inspection_request'),
     path('get-available-times/', views.get_available_times, name='get_available_times'),
+    path('api/inspection-availability/', views.inspection_availability, name='inspection_availability'),
     path('car/<int:car_id>/upload-photos/', views.upload_car_photos, name='upload_car_photos'),
 ]
\ No newline at end of file
@@ -1,26 +1,42 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.conf import settings
-from django.http import HttpResponse
-from django.utils import timezone
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from .models import Car, PurchaseAgreementRequest, InspectionRequest
+from .models import Car, CarPhoto, PurchaseAgreementRequest, InspectionRequest, Task
 from .forms import PurchaseAgreementForm, InspectionRequestForm, CarPhotoUploadForm
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from .forms import CarFilterForm
-from io import BytesIO
-import os
-from django.db.models import Q
-import random
-from django.http import JsonResponse
-from PyPDF2 import PdfReader, PdfWriter
+from . import api, availability
+from .agreement_pdf import agreement_filename
+from .agreement_store import agreement_fingerprint, is_current
+from .cache import cache_anonymous_page
+from .conditional import conditional_view, car_validators, car_etag, car_last_modified, metadata_etag, available_times_etag, \
+    availability_etag
+from .facets import get_facets
+from .featured import featured_car_ids
+from .metadata import get_catalog_metadata, model_names
+from .pagination import keyset_paginate, querystring
+from .ranges import ranged_file_response
+from .renditions import photo_urls
+from .inventory_index import search_car_ids, is_enabled as inventory_index_enabled
+from .tasks import enqueue
+from .photos import MAX_PHOTOS_PER_CAR
+from .queries import published_cars, car_cards, car_detail_queryset, filter_car_list, car_list_criteria, cars_in_order
+from django.http import JsonResponse, StreamingHttpResponse
 import datetime
 
+AGREEMENT_SALT = 'catalog.agreement'
+AGREEMENT_JOB_SALT = 'catalog.agreement_job'
+GALLERY_PAGE_SIZE = 6
+
+@cache_anonymous_page
 def index(request):
-    all_cars = list(Car.objects.filter(is_published=True, is_sold=False))
-    random_cars = random.sample(all_cars, min(6, len(all_cars)))
+    random_cars = cars_in_order(car_cards(), featured_car_ids(6))
     
     quick_filters = [
         {
@@ -79,166 +95,135 @@ def index(request):
         'quick_filters': quick_filters
     })
 
+@cache_anonymous_page
 def car_list(request):
-    cars = Car.objects.filter(is_published=True, is_sold=False)
-    
-
+    cars = car_cards()
     filter_form = CarFilterForm(request.GET or None)
-    
-
-    max_price = request.GET.get('max_price')
-    min_year = request.GET.get('min_year')
-    max_mileage = request.GET.get('max_mileage')
-    brand = request.GET.get('brand')
-    transmission = request.GET.get('transmission')
-    body_type = request.GET.get('body_type')
-    brands = request.GET.getlist('brand') 
-    
-    if brands:
-        cars = cars.filter(brand__in=brands)
-    
-
-    if max_price:
-        cars = cars.filter(price__lte=int(max_price))
-    if min_year:
-        cars = cars.filter(year__gte=int(min_year))
-    if max_mileage:
-        cars = cars.filter(mileage__lte=int(max_mileage))
-    if brand:
-        cars = cars.filter(brand=brand)
-    if transmission:
-        cars = cars.filter(transmission=transmission)
-    if body_type:
-        cars = cars.filter(body_type=body_type)
-    
-
-    if filter_form.is_valid():
-        brand_form = filter_form.cleaned_data.get('brand')
-        model = filter_form.cleaned_data.get('model')
-        min_price_form = filter_form.cleaned_data.get('min_price')
-        max_price_form = filter_form.cleaned_data.get('max_price')
-        year_range = filter_form.cleaned_data.get('year_range')
-        transmission_form = filter_form.cleaned_data.get('transmission')
-        engine_type = filter_form.cleaned_data.get('engine_type')
-        features = filter_form.cleaned_data.get('features')
-        sort = filter_form.cleaned_data.get('sort') or '-created_at'
-        country = request.GET.get('country')
-        
-
-        if brand_form and not brand: 
-            cars = cars.filter(brand=brand_form)
-
-        if country:
-            cars = cars.filter(country=country)
-        
-
-        if model:
-            cars = cars.filter(model=model)
-        
-
-        if min_price_form:
-            cars = cars.filter(price__gte=min_price_form)
-        if max_price_form:
-            cars = cars.filter(price__lte=max_price_form)
-        
-
-        if year_range:
-            if year_range == '2020-':
-                cars = cars.filter(year__gte=2020)
-            elif year_range == '2015-2019':
-                cars = cars.filter(year__range=(2015, 2019))
-            elif year_range == '2010-2014':
-                cars = cars.filter(year__range=(2010, 2014))
-            elif year_range == '-2009':
-                cars = cars.filter(year__lte=2009)
-        
-
-        if transmission_form and not transmission:
-            cars = cars.filter(transmission=transmission_form)
-        
-
-        if engine_type:
-            cars = cars.filter(engine_type=engine_type)
-        
-
-        if features:
-            cars = cars.filter(features__in=features).distinct()
-        
-
-        cars = cars.order_by(sort)
+    cars = filter_car_list(cars, request.GET, filter_form)
+    facets = get_facets(cars, request.GET)
+    filter_form.apply_facets(facets)
+
+    cursor_mode = request.GET.get('paging') == 'cursor' or 'cursor' in request.GET
+    if cursor_mode:
+        cars = keyset_paginate(cars, request.GET.get('cursor'), per_page=12)
+        next_query = querystring(request.GET, cursor=cars.next_cursor, paging='cursor', page=None)
+        prev_query = querystring(request.GET, cursor=cars.prev_cursor, paging='cursor', page=None)
     else:
+        criteria, sort = car_list_criteria(request.GET, filter_form)
+        # Полнотекстовый поиск индекс в памяти не умеет
+        use_index = inventory_index_enabled() and all(lookup != 'search' for lookup, _ in criteria)
+        if use_index:
+            paginator = Paginator(search_car_ids(criteria, sort), 12)
+        else:
+            paginator = Paginator(cars, 12)
+        page = request.GET.get('page')
+        try:
+            page_obj = paginator.page(page)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
+        if use_index:
+            page_obj.object_list = cars_in_order(car_cards(), page_obj.object_list.tolist())
+        cars = page_obj
+        next_query = prev_query = None
 
-        cars = cars.order_by('-created_at')
-    
-
-    paginator = Paginator(cars, 12)
-    page = request.GET.get('page')
-    try:
-        cars = paginator.page(page)
-    except PageNotAnInteger:
-        cars = paginator.page(1)
-    except EmptyPage:
-        cars = cars.page(paginator.num_pages)
-    
     return render(request, 'catalog/car_list.html', {
         'cars': cars,
-        'filter_form': filter_form
+        'filter_form': filter_form,
+        'facets': facets,
+        'cursor_mode': cursor_mode,
+        'next_query': next_query,
+        'prev_query': prev_query,
     })
     
 def upload_car_photos(request, car_id):
     car = get_object_or_404(Car, id=car_id)
     
     if request.method == 'POST':
-        form = CarPhotoUploadForm(request.POST, request.FILES)
+        form = CarPhotoUploadForm(request.POST, request.FILES, car=car)
         if form.is_valid():
-            form.save_photos(car)
-            return redirect('car_detail', car_id=car.id)
+            try:
+                form.save_photos(car)
+            except ValidationError as error:
+                form.add_error('images', error)
+            else:
+                return redirect('car_detail', car_id=car.id)
     else:
-        form = CarPhotoUploadForm()
+        form = CarPhotoUploadForm(car=car)
     
     return render(request, 'catalog/upload_photos.html', {
         'form': form,
         'car': car
     })
 
+def api_cars(request):
+    """Каталог в JSON: фильтры CarFilterForm, fields=, курсорные страницы или поток JSON Lines"""
+    fields, unknown = api.parse_fields(request.GET.get('fields'))
+    if unknown:
+        return JsonResponse({'error': f"Неизвестные поля: {', '.join(unknown)}"}, status=400)
+
+    filter_form = CarFilterForm(request.GET or None)
+    if filter_form.is_bound and not filter_form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры фильтра', 'fields': filter_form.errors}, status=400)
+    cars = filter_car_list(published_cars(), request.GET, filter_form)
+
+    if request.GET.get('format') == 'jsonl':
+        response = StreamingHttpResponse(api.jsonl_lines(cars, fields), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'inline; filename="cars.jsonl"'
+        return response
+
+    # Для курсора нужны поле сортировки и id, даже если клиент их не просил
+    sort_field = cars.query.order_by[0].lstrip('-')
+    selected = list(dict.fromkeys(fields + ['id', sort_field]))
+    page = keyset_paginate(cars.values(*selected), request.GET.get('cursor'),
+                           per_page=api.parse_limit(request.GET.get('limit')))
+    return HttpResponse(api.dumps({
+        'results': [api.project(row, fields) for row in page],
+        'has_more': page.has_next(),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }), content_type='application/json')
+
+@conditional_view(etag_func=metadata_etag)
 def get_models(request):
     brand = request.GET.get('brand', '')
     if brand:
-        models = Car.objects.filter(brand=brand, is_published=True, is_sold=False) \
-                          .values_list('model', flat=True) \
-                          .distinct() \
-                          .order_by('model')
-        return JsonResponse({'models': list(models)})
+        return JsonResponse({'models': model_names(brand)})
     return JsonResponse({'models': []})
 
+@conditional_view(etag_func=metadata_etag)
+def catalog_metadata(request):
+    """Марки, модели и диапазоны фильтров одним ответом; клиент кэширует его по ETag"""
+    return JsonResponse(get_catalog_metadata()['data'], json_dumps_params={'ensure_ascii': False})
+
+@conditional_view(etag_func=car_etag, last_modified_func=car_last_modified)
+@cache_anonymous_page
 def car_detail(request, car_id):
-    car = get_object_or_404(Car, id=car_id, is_published=True)
+    car = get_object_or_404(car_detail_queryset(), id=car_id)
     context = {
         'car': car,
         'showroom_phone': settings.SHOWROOM_PHONE
     }
     return render(request, 'catalog/car_detail.html', context)
 
-def get_russian_font():
+@conditional_view(etag_func=car_etag)
+def car_gallery(request, car_id):
+    """Фотографии автомобиля постранично в JSON: карусели подгружают их только при взаимодействии"""
+    if car_validators(request, car_id) is None:
+        raise Http404
     try:
-
-        font_path_regular = os.path.join(settings.BASE_DIR, 'catalog', 'static', 'fonts', 'times.ttf')
-        font_path_bold = os.path.join(settings.BASE_DIR, 'catalog', 'static', 'fonts', 'timesbd.ttf')
-        
-
-        if os.path.exists(font_path_regular):
-            pdfmetrics.registerFont(TTFont('Times-Roman', font_path_regular))
-        
-
-        if os.path.exists(font_path_bold):
-            pdfmetrics.registerFont(TTFont('Times-Bold', font_path_bold))
-            
-        return 'Times-Roman'
-        
-    except Exception as e:
-        print(f"Ошибка регистрации шрифта: {e}")
-    
-    return 'Helvetica'
+        per_page = max(1, min(int(request.GET.get('limit', GALLERY_PAGE_SIZE)), MAX_PHOTOS_PER_CAR))
+    except ValueError:
+        per_page = GALLERY_PAGE_SIZE
+    photos = CarPhoto.objects.filter(car_id=car_id).order_by('-is_main', 'id')
+    page = Paginator(photos, per_page).get_page(request.GET.get('page'))
+    return JsonResponse({
+        'results': [photo_urls(photo) for photo in page],
+        'page': page.number,
+        'has_next': page.has_next(),
+        'count': page.paginator.count,
+    })
 
 def purchase_agreement(request, car_id):
     car = get_object_or_404(Car, id=car_id, is_published=True)
@@ -261,12 +246,33 @@ def purchase_agreement(request, car_id):
                 agreement.car_year = car.year
                 agreement.car_price = car.price
                 
+                existing = PurchaseAgreementRequest.objects.filter(
+                    car=car, pdf_hash=agreement_fingerprint(agreement),
+                ).first()
+                if existing is not None:
+                    # Такой же договор сегодня уже оформляли - отдаем готовый файл
+                    download_url = reverse('agreement_download', args=[agreement_token(existing)])
+                    if wants_json(request):
+                        return JsonResponse({'job_id': None, 'status': 'done', 'download_url': download_url})
+                    return redirect(download_url)
+
                 agreement.save()
-                
-                return generate_agreement_pdf(agreement)
+                # PDF рендерит run_worker, запрос только ставит задачу
+                job = enqueue('catalog.render_agreement', agreement_id=agreement.pk)
+
+                if wants_json(request):
+                    job_id = agreement_job_id(job)
+                    return JsonResponse({
+                        'job_id': job_id,
+                        'status': job.status,
+                        'status_url': reverse('agreement_job', args=[job_id]),
+                    }, status=202)
+                return redirect('agreement_status', token=agreement_token(agreement))
                 
             except Exception as e:
                 return HttpResponse(f"Ошибка при создании договора: {str(e)}")
+        if wants_json(request):
+            return JsonResponse({'errors': form.errors}, status=400, json_dumps_params={'ensure_ascii': False})
     else:
         form = PurchaseAgreementForm()
     
@@ -275,191 +281,83 @@ def purchase_agreement(request, car_id):
         'car': car
     })
 
-def generate_agreement_pdf(agreement):
-    try:
-        template_path = os.path.join(settings.BASE_DIR, 'catalog', 'static', 'dkp.pdf')
-        
-        if not os.path.exists(template_path):
-            return generate_simple_agreement_pdf(agreement)
-        
-        buffer = BytesIO()
-        
-        reader = PdfReader(template_path)
-        writer = PdfWriter()
-        
-        page = reader.pages[0]
-        
-        packet = BytesIO()
-        can = canvas.Canvas(packet, pagesize=A4)
-        
-        font_name = get_russian_font()
-        can.setFont(font_name, 10)
-        
-        can.drawString(40, 743, agreement.seller_full_name)
-        can.drawString(40, 722, f"Паспорт: {agreement.seller_passport_series} {agreement.seller_passport_number}")
-        can.drawString(40, 700, f"Выдан: {agreement.seller_passport_issued}")
-        can.drawString(40, 679, f"Адрес: {agreement.seller_registration_address}")
-        
-        can.drawString(40, 640, agreement.buyer_full_name)
-        can.drawString(40, 618, f"Паспорт: {agreement.buyer_passport_series} {agreement.buyer_passport_number}")
-        can.drawString(40, 597, f"Выдан: {agreement.buyer_passport_issued}")
-        can.drawString(40, 576, f"Адрес: {agreement.buyer_registration_address}")
-        
-        can.drawString(40, 475, f"{agreement.car_brand} {agreement.car_model}")
-        can.drawString(50, 454, agreement.car_vin or "не указан")
-        can.drawString(410, 454, str(agreement.car_year))
-        
-        car_color = agreement.car.color if hasattr(agreement.car, 'color') and agreement.car.color else 'не указан'
-        can.drawString(250, 410, car_color)
-        
-        can.drawString(250, 454, agreement.car_license_plate or "не указан")
-        
-        can.drawString(55, 303, f"{agreement.car_price:,} руб.".replace(',', ' '))
-        can.drawString(200, 303, num2words(agreement.car_price) + " рублей")
-        
-        can.drawString(240, 809, "Барнаул")
-        can.drawString(285, 809, timezone.now().strftime('%d.%m.%Y'))
-        
-        can.save()
-        
-        packet.seek(0)
-        new_pdf = PdfReader(packet)
-        
-        page.merge_page(new_pdf.pages[0])
-        writer.add_page(page)
-        
-        writer.write(buffer)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="dogovor-kupli-prodazhi-{agreement.car_brand}-{agreement.car_model}.pdf"'
-        return response
-        
-    except Exception as e:
-        return generate_simple_agreement_pdf(agreement)
-
-def generate_simple_agreement_pdf(agreement):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    
-    font_name = get_russian_font()
-    
-    y_position = height - 50
-    line_height = 14
-
-    p.setFont('Times-Bold', 16)
-    p.drawCentredString(width/2, y_position, "ДОГОВОР КУПЛИ-ПРОДАЖИ АВТОМОБИЛЯ")
-    y_position -= 40
-    
-
-    p.setFont('Times-Roman', 12)
-    p.drawString(100, y_position, "Город Барнаул")
-    p.drawString(250, y_position, f"{timezone.now().strftime('%d.%m.%Y')} г.")
-    y_position -= 40
-    
+def agreement_token(agreement):
+    """Подписанный id договора для ссылки: по порядковому id нельзя перебрать чужие паспортные данные"""
+    return signing.dumps(agreement.pk, salt=AGREEMENT_SALT)
 
-    p.drawString(50, y_position, f"Продавец: {agreement.seller_full_name}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Паспорт: {agreement.seller_passport_series} № {agreement.seller_passport_number}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Выдан: {agreement.seller_passport_issued}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Адрес: {agreement.seller_registration_address}")
-    y_position -= line_height * 2
-    
-    p.drawString(50, y_position, f"Покупатель: {agreement.buyer_full_name}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Паспорт: {agreement.buyer_passport_series} № {agreement.buyer_passport_number}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Выдан: {agreement.buyer_passport_issued}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Адрес: {agreement.buyer_registration_address}")
-    y_position -= line_height * 2
-    
+def wants_json(request):
+    """Клиент с fetch/XHR просит JSON, браузер с обычной формой - HTML"""
+    return request.get_preferred_type(['text/html', 'application/json']) == 'application/json'
 
-    p.drawString(50, y_position, f"Автомобиль: {agreement.car_brand} {agreement.car_model}, {agreement.car_year} г.в.")
-    y_position -= line_height
-    p.drawString(50, y_position, f"VIN: {agreement.car_vin or 'не указан'}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Госномер: {agreement.car_license_plate or 'не указан'}")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Стоимость: {agreement.car_price:,} руб. ({num2words(agreement.car_price)} рублей)".replace(',', ' '))
-    y_position -= line_height * 2
-    
+def agreement_job_id(job):
+    return signing.dumps(job.pk, salt=AGREEMENT_JOB_SALT)
 
-    p.drawString(50, y_position, "Продавец: _________________________")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Ф.И.О.: {agreement.seller_full_name}")
-    y_position -= line_height * 2
-    
-    p.drawString(50, y_position, "Покупатель: _________________________")
-    y_position -= line_height
-    p.drawString(50, y_position, f"Ф.И.О.: {agreement.buyer_full_name}")
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="dogovor-kupli-prodazhi-{agreement.car_brand}-{agreement.car_model}.pdf"'
+def agreement_job(request, job_id):
+    """
+    Легкий статус задачи рендера для опроса: один запрос по первичному ключу, без договора
+    и PDF. Готовая задача перенаправляет на файл.
+    """
+    try:
+        task_id = signing.loads(job_id, salt=AGREEMENT_JOB_SALT)
+    except signing.BadSignature:
+        raise Http404
+    job = Task.objects.filter(pk=task_id, name='catalog.render_agreement') \
+                      .values('status', 'attempts', 'payload').first()
+    if job is None:
+        raise Http404
+
+    if job['status'] == 'done':
+        response = redirect('agreement_download', token=signing.dumps(job['payload']['agreement_id'], salt=AGREEMENT_SALT))
+    else:
+        # Ошибку с трейсбеком наружу не отдаем - она в админке, в Task.last_error
+        response = JsonResponse({'status': job['status'], 'attempts': job['attempts']})
+    patch_cache_control(response, no_store=True)
     return response
 
-def num2words(num, lang='ru'):
-    """Функция для преобразования числа в слова (упрощенная версия)"""
-    if num == 0:
-        return 'ноль'
-    
-
-    units = ['', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять']
-    teens = ['десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать', 
-             'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать']
-    tens = ['', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто']
-    hundreds = ['', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот']
-    
-    def convert_triplet(n):
-        """Конвертирует трехзначное число"""
-        result = []
-        
-
-        if n >= 100:
-            result.append(hundreds[n // 100])
-            n %= 100
-        
-
-        if n >= 20:
-            result.append(tens[n // 10])
-            if n % 10 > 0:
-                result.append(units[n % 10])
-        elif n >= 10:
-            result.append(teens[n - 10])
-        elif n > 0:
-            result.append(units[n])
-        
-        return ' '.join(result)
-    
-    result_parts = []
-    n = num
-    
-
-    if n >= 1000000:
-        millions_part = n // 1000000
-        result_parts.append(convert_triplet(millions_part))
-        result_parts.append('миллионов')
-        n %= 1000000
-    
-
-    if n >= 1000:
-        thousands_part = n // 1000
-        result_parts.append(convert_triplet(thousands_part))
-        result_parts.append('тысяч')
-        n %= 1000
-    
+def agreement_from_token(request, token):
+    """Договор по подписанной ссылке; на запрос загружается один раз"""
+    if not hasattr(request, '_agreement'):
+        try:
+            agreement_id = signing.loads(token, salt=AGREEMENT_SALT)
+        except signing.BadSignature:
+            raise Http404
+        request._agreement = get_object_or_404(PurchaseAgreementRequest.objects.select_related('car'), pk=agreement_id)
+    return request._agreement
+
+def agreement_status(request, token):
+    """Пока PDF договора рендерится - страница ожидания с автообновлением, потом переход к скачиванию"""
+    agreement = agreement_from_token(request, token)
+    if is_current(agreement):
+        return redirect('agreement_download', token=token)
+
+    task = Task.objects.filter(name='catalog.render_agreement', payload__agreement_id=agreement.pk) \
+                       .order_by('-id').first()
+    if task is None or task.status == 'done':
+        # Данные или бланк поменялись после прошлого рендера
+        task = enqueue('catalog.render_agreement', agreement_id=agreement.pk)
+    return render(request, 'catalog/agreement_status.html', {
+        'agreement': agreement,
+        'failed': task.status == 'failed',
+        'job_url': reverse('agreement_job', args=[agreement_job_id(task)]),
+    })
 
-    if n > 0:
-        result_parts.append(convert_triplet(n))
-    
-    return ' '.join(result_parts)
+def agreement_pdf_etag(request, token):
+    agreement = agreement_from_token(request, token)
+    return agreement.pdf_hash if is_current(agreement) else None
+
+@condition(etag_func=agreement_pdf_etag)
+def agreement_download(request, token):
+    """Сохраненный PDF договора без повторного рендера; Range - для докачки и просмотра в браузере"""
+    agreement = agreement_from_token(request, token)
+    if not is_current(agreement):
+        return redirect('agreement_status', token=token)
+    response = ranged_file_response(
+        request, agreement.pdf.open('rb'), agreement.pdf.size, quote_etag(agreement.pdf_hash),
+        agreement_filename(agreement), content_type='application/pdf',
+    )
+    # Внутри паспортные данные: только в кэше браузера, и каждый раз с проверкой ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 def inspection_request(request, car_id):
     """Запись на осмотр автомобиля"""
@@ -488,6 +386,7 @@ def inspection_request(request, car_id):
         'car': car
     })
 
+@conditional_view(etag_func=available_times_etag)
 def get_available_times(request):
     """API для получения доступных временных слотов"""
     date = request.GET.get('date')
@@ -507,4 +406,20 @@ def get_available_times(request):
         except ValueError:
             pass
     
-    return JsonResponse({'available_times': []})
\ No newline at end of file
+    return JsonResponse({'available_times': []})
+
+@conditional_view(etag_func=availability_etag)
+def inspection_availability(request):
+    """
+    Свободные слоты на диапазон до 60 дней для календаря: ?start=2025-03-01&days=31.
+    days - маски свободных слотов по рабочим дням, бит i - slots[i]
+    """
+    start, days = availability.parse_range(request.GET)
+    if start is None:
+        return JsonResponse({'error': 'Дата start указывается как ГГГГ-ММ-ДД'}, status=400)
+    return JsonResponse({
+        'start': start.isoformat(),
+        'slots': availability.SLOTS,
+        'days': availability.free_slot_masks(start, days),
+    })
+